@@ -0,0 +1,174 @@
+"""
+Async CRUD operations for the DQX application.
+Async counterparts of the read queries in app.crud, used by async route handlers
+with connections from app.async_database. The synchronous functions in app.crud
+remain the implementation for sync handlers, the scheduler and CLI tools.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import psycopg
+
+from app.crud import _process_result_row, BAD_DETAIL_COUNT_QUERY
+from app.result_cache import DATA_VERSIONS_QUERY, cache_key, result_cache
+from app.single_flight import async_query_flight
+from app.serialization import ResultSerializer
+
+
+# ========================================================================================
+# STATISTICS OPERATIONS
+# ========================================================================================
+
+async def get_script_count(db) -> int:
+    """Get the total number of SQL scripts."""
+    try:
+        async with db.cursor() as cursor:
+            await cursor.execute("SELECT COUNT(*) FROM dq.dq_sql_scripts")
+            return (await cursor.fetchone())[0]
+    except Exception as e:
+        print(f"Error getting script count: {str(e)}")
+        await db.rollback()
+        return 0
+
+
+async def _sync_cache_versions(db, query: str):
+    """Async counterpart of crud._sync_cache_versions."""
+    tables = result_cache.tables_to_check(query)
+    if not tables:
+        return
+    try:
+        async with db.cursor() as cursor:
+            await cursor.execute(DATA_VERSIONS_QUERY, (list(tables),))
+            result_cache.sync_versions(tables, dict(await cursor.fetchall()))
+    except psycopg.errors.UndefinedTable:
+        await db.rollback()
+        result_cache.disable_shared_versions()
+
+
+async def get_bad_detail_count(db) -> int:
+    """Get the total number of records in the bad_detail table (cached until the next publish)."""
+    await _sync_cache_versions(db, BAD_DETAIL_COUNT_QUERY)
+    cached = result_cache.get(BAD_DETAIL_COUNT_QUERY)
+    if cached is not None:
+        return cached
+    try:
+        stamp = result_cache.stamp(BAD_DETAIL_COUNT_QUERY)
+        async with db.cursor() as cursor:
+            await cursor.execute(BAD_DETAIL_COUNT_QUERY)
+            count = (await cursor.fetchone())[0]
+        result_cache.set(BAD_DETAIL_COUNT_QUERY, None, count, stamp)
+        return count
+    except Exception as e:
+        print(f"Error getting bad_detail count: {str(e)}")
+        await db.rollback()
+        return 0
+
+
+# ========================================================================================
+# SQL SCRIPT MANAGEMENT
+# ========================================================================================
+
+async def get_sql_scripts(db) -> List[Dict[str, Any]]:
+    """Get all saved SQL scripts from the database."""
+    try:
+        async with db.cursor() as cursor:
+            query = "SELECT id, name, description, content, created_at, updated_at FROM DQ.dq_sql_scripts ORDER BY id ASC;"
+            await cursor.execute(query)
+
+            fetched_rows = await cursor.fetchall()
+
+            if not cursor.description:
+                return []
+
+            column_names = [desc.name for desc in cursor.description]
+
+            if 'id' not in column_names:
+                raise ValueError("The 'id' column is missing from the dq_sql_scripts table.")
+
+            id_index = column_names.index('id')
+            return [dict(zip(column_names, row)) for row in fetched_rows if row[id_index] is not None]
+
+    except psycopg.Error as db_err:
+        raise ValueError(f"Database query failed: {str(db_err)}") from db_err
+    except ValueError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"An unexpected error occurred in get_sql_scripts: {str(e)}") from e
+
+
+async def get_sql_script(db, script_id: int) -> Optional[Dict[str, Any]]:
+    """Get a single SQL script by ID."""
+    try:
+        async with db.cursor() as cursor:
+            await cursor.execute(
+                "SELECT id, name, description, content, created_at, updated_at FROM dq.dq_sql_scripts WHERE id = %s;",
+                (script_id,)
+            )
+            script_tuple = await cursor.fetchone()
+            if not script_tuple:
+                return None
+
+            if cursor.description is None:
+                raise ValueError(f"Failed to get column descriptions for script ID {script_id}.")
+
+            column_names = [desc.name for desc in cursor.description]
+            return _process_result_row(script_tuple, column_names)
+    except (psycopg.Error, ValueError):
+        raise
+    except Exception as e:
+        raise RuntimeError(f"An unexpected error occurred in get_sql_script for ID {script_id}: {str(e)}") from e
+
+
+# ========================================================================================
+# QUERY EXECUTION
+# ========================================================================================
+
+async def execute_query(query: str, db, params: Optional[List[Any]] = None) -> Dict[str, Any]:
+    """
+    Execute a SQL query and return results in the same format as crud.execute_query.
+
+    Args:
+        query: SQL query string to execute
+        db: Async database connection
+        params: Optional list of parameters for the query
+
+    Returns:
+        Dictionary with 'data' key containing list of row dictionaries,
+        and 'column_names' key containing list of column names
+    """
+    try:
+        async with db.cursor() as cursor:
+            if params:
+                await cursor.execute(query, params)
+            else:
+                await cursor.execute(query)
+
+            serializer = ResultSerializer(cursor.description)
+            rows = await cursor.fetchall() if cursor.description else []
+
+            return {
+                "data": serializer.records(rows),
+                "column_names": serializer.column_names
+            }
+
+    except psycopg.Error as db_err:
+        await db.rollback()
+        raise ValueError(f"Database query failed: {str(db_err)}") from db_err
+    except Exception as e:
+        raise RuntimeError(f"An unexpected error occurred in execute_query: {str(e)}") from e
+
+
+async def execute_cached_query(query: str, db, params: Optional[List[Any]] = None) -> Dict[str, Any]:
+    """Async counterpart of crud.execute_cached_query (shared result; don't modify it)."""
+    await _sync_cache_versions(db, query)
+    cached = result_cache.get(query, params)
+    if cached is not None:
+        return cached
+    stamp = result_cache.stamp(query)
+
+    async def run():
+        result = await execute_query(query, db, params)
+        result_cache.set(query, params, result, stamp)
+        return result
+
+    return await async_query_flight.do((cache_key(query, params), stamp), run)
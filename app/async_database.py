@@ -0,0 +1,92 @@
+"""
+Async database access for the DQX application.
+
+Async route handlers use psycopg 3 connections from an AsyncConnectionPool so
+that a slow query does not block the event loop. The pool is sized from the
+same DB_POOL_* settings as the synchronous pool in app.database, which remains
+the code path for sync handlers, the scheduler and command line tools.
+"""
+
+from typing import Any, Dict
+
+from psycopg_pool import AsyncConnectionPool
+
+from app.database import DATABASE_URL, DB_TYPE
+from app.db_pool import pool_settings_from_env
+
+
+def create_async_pool(dsn: str, name: str, settings: Dict[str, Any]) -> AsyncConnectionPool:
+    """
+    Create a (not yet opened) async pool from ConnectionPool-style settings.
+
+    Args:
+        dsn: PostgreSQL connection string
+        name: Pool name used in stats and log messages
+        settings: Settings as returned by pool_settings_from_env()
+
+    Returns:
+        AsyncConnectionPool that is opened on first use by open_async_pool()
+    """
+    connect_timeout = settings.get("connect_timeout", 0)
+    return AsyncConnectionPool(
+        dsn,
+        name=name,
+        open=False,
+        kwargs={"connect_timeout": connect_timeout} if connect_timeout > 0 else None,
+        min_size=settings["min_size"],
+        max_size=settings["max_size"],
+        max_idle=settings["idle_timeout"],
+        max_lifetime=settings["max_lifetime"],
+        timeout=settings["checkout_timeout"],
+        check=AsyncConnectionPool.check_connection if settings["validate_on_checkout"] else None,
+    )
+
+
+async def open_async_pool(pool: AsyncConnectionPool) -> AsyncConnectionPool:
+    """Open a pool if needed (safe to call on an already open pool)."""
+    await pool.open()
+    return pool
+
+
+def async_pool_stats(pool: AsyncConnectionPool) -> Dict[str, Any]:
+    """Return usage statistics for an async pool in the same shape as ConnectionPool.stats()."""
+    stats = pool.get_stats()
+    size = stats.get("pool_size", 0)
+    idle = stats.get("pool_available", 0)
+    return {
+        "name": pool.name,
+        "min_size": stats.get("pool_min", pool.min_size),
+        "max_size": stats.get("pool_max", pool.max_size),
+        "size": size,
+        "in_use": size - idle,
+        "idle": idle,
+        "waiters": stats.get("requests_waiting", 0),
+        "closed": pool.closed,
+        "checkouts": stats.get("requests_num", 0),
+        "checkout_timeouts": stats.get("requests_errors", 0),
+        "connections_created": stats.get("connections_num", 0),
+    }
+
+
+# Async connection pool for the application database
+async_db_pool = create_async_pool(DATABASE_URL, "default-async", pool_settings_from_env("DB_"))
+
+
+# Dependency to get an async DB connection
+async def get_async_db():
+    if DB_TYPE.lower() != "postgresql":
+        raise NotImplementedError(f"Async database access is not supported for {DB_TYPE}")
+    await open_async_pool(async_db_pool)
+    async with async_db_pool.connection() as conn:
+        yield conn
+
+
+def get_async_pool_stats() -> Dict[str, Any]:
+    """Return usage statistics for the application async pool."""
+    return async_pool_stats(async_db_pool)
+
+
+async def close_async_db_pool():
+    """Close the application async pool (called on shutdown)."""
+    if not async_db_pool.closed:
+        await async_db_pool.close()
@@ -0,0 +1,261 @@
+"""
+Asynchronous, batched writer for the user actions audit log.
+
+UserActionLoggingMiddleware enqueues an event and returns immediately. A
+background thread drains the bounded queue and writes events to
+dq.user_actions_log with one multi-row INSERT per batch. A batch is flushed
+when it reaches AUDIT_LOG_BATCH_SIZE events or when AUDIT_LOG_FLUSH_INTERVAL
+seconds have passed since its first event, and the queue is drained on
+shutdown.
+
+When the queue is full (or a batch cannot be written) events are either
+dropped or, with AUDIT_LOG_OVERFLOW=spill, appended to a JSON lines file that
+is replayed into the table the next time the writer starts.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app import crud
+from app.database import PROJECT_ROOT, db_pool
+
+AUDIT_LOG_QUEUE_SIZE = int(os.getenv("AUDIT_LOG_QUEUE_SIZE", "10000"))
+AUDIT_LOG_BATCH_SIZE = int(os.getenv("AUDIT_LOG_BATCH_SIZE", "200"))
+AUDIT_LOG_FLUSH_INTERVAL = float(os.getenv("AUDIT_LOG_FLUSH_INTERVAL", "1.0"))
+AUDIT_LOG_OVERFLOW = os.getenv("AUDIT_LOG_OVERFLOW", "drop").lower()  # "drop" or "spill"
+AUDIT_LOG_SPILL_PATH = os.getenv("AUDIT_LOG_SPILL_PATH", os.path.join(PROJECT_ROOT, "logs", "audit_log_spill.jsonl"))
+
+_STOP = object()
+
+
+class AuditLogWriter:
+    """Bounded queue of audit events drained by a background writer thread."""
+
+    def __init__(self, pool, max_queue: int = AUDIT_LOG_QUEUE_SIZE, batch_size: int = AUDIT_LOG_BATCH_SIZE,
+                 flush_interval: float = AUDIT_LOG_FLUSH_INTERVAL, overflow: str = AUDIT_LOG_OVERFLOW,
+                 spill_path: str = AUDIT_LOG_SPILL_PATH):
+        if overflow not in ("drop", "spill"):
+            raise ValueError(f"Unsupported audit log overflow mode: {overflow}")
+        self.pool = pool
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.spill_path = spill_path
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._closed = False
+
+        self._counters = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "dropped": 0,
+            "spilled": 0,
+            "replayed": 0,
+            "write_errors": 0,
+        }
+        self._counters_lock = threading.Lock()
+        self._last_flush_ms = 0.0
+        self._last_error: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def log_action(self, user_id: int, username: str, action: str, resource_type: Optional[str] = None,
+                   resource_id: Optional[int] = None, details: Optional[dict] = None,
+                   user_agent: Optional[str] = None) -> bool:
+        """Queue a user action. Returns False if it was dropped or spilled instead."""
+        event = {
+            "user_id": user_id,
+            "username": username,
+            "action": action,
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "details": details,
+            "user_agent": user_agent,
+            "created_at": datetime.now(),
+        }
+        if self._closed:
+            self._overflow([event])
+            return False
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._overflow([event])
+            return False
+        self._count("enqueued")
+        return True
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        self._replay_spill()
+        stopping = False
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if first is _STOP:
+                break
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if event is _STOP:
+                    stopping = True
+                    break
+                batch.append(event)
+            self._write(batch)
+
+        # Drain whatever is left after the stop marker
+        batch = []
+        while True:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if event is not _STOP:
+                batch.append(event)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        if not batch:
+            return True
+        started = time.perf_counter()
+        try:
+            with self.pool.connection() as db:
+                try:
+                    written = crud.log_user_actions_batch(db, batch)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+        except Exception as e:
+            print(f"Error writing {len(batch)} audit log events: {e}")
+            self._last_error = str(e)
+            self._count("write_errors")
+            self._overflow(batch)
+            return False
+
+        self._last_flush_ms = (time.perf_counter() - started) * 1000
+        self._count("written", written)
+        self._count("batches")
+        return True
+
+    # ------------------------------------------------------------------
+    # Overflow handling
+    # ------------------------------------------------------------------
+
+    def _overflow(self, events: List[Dict[str, Any]]):
+        if self.overflow == "spill":
+            try:
+                self._spill(events)
+                self._count("spilled", len(events))
+                return
+            except Exception as e:
+                print(f"Error spilling audit log events to {self.spill_path}: {e}")
+        self._count("dropped", len(events))
+
+    def _spill(self, events: List[Dict[str, Any]]):
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for event in events:
+                    f.write(json.dumps({**event, "created_at": event["created_at"].isoformat()}) + "\n")
+
+    def _replay_spill(self):
+        """Write events spilled by a previous run back into the table."""
+        if self.overflow != "spill" or not os.path.exists(self.spill_path):
+            return
+        with self._spill_lock:
+            replay_path = f"{self.spill_path}.replay"
+            try:
+                os.replace(self.spill_path, replay_path)
+            except OSError:
+                return
+        try:
+            with open(replay_path, encoding="utf-8") as f:
+                events = [json.loads(line) for line in f if line.strip()]
+        except Exception as e:
+            print(f"Error reading spilled audit log events from {replay_path}: {e}")
+            return
+
+        for event in events:
+            event["created_at"] = datetime.fromisoformat(event["created_at"])
+        for i in range(0, len(events), self.batch_size):
+            batch = events[i:i + self.batch_size]
+            if self._write(batch):
+                self._count("replayed", len(batch))
+        os.remove(replay_path)
+
+    # ------------------------------------------------------------------
+    # Lifecycle and metrics
+    # ------------------------------------------------------------------
+
+    def close(self, timeout: float = 10.0):
+        """Flush queued events and stop the writer thread (called on shutdown)."""
+        self._closed = True
+        thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            print("Audit log queue still full at shutdown; waiting for the writer to drain it")
+        thread.join(timeout)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._counters_lock:
+            self._counters[name] += amount
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and counters for monitoring."""
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "overflow": self.overflow,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "last_flush_ms": round(self._last_flush_ms, 3),
+            "last_error": self._last_error,
+            **counters,
+        }
+
+
+# Global instance used by UserActionLoggingMiddleware
+audit_log_writer = AuditLogWriter(db_pool)
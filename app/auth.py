@@ -9,6 +9,7 @@ from fastapi.security import OAuth2PasswordBearer
 from app import crud
 from app.database import get_db
 from app.schemas import TokenData, User
+from app.token_revocation import token_revocations
 
 # Constants
 SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
@@ -44,11 +45,27 @@ def authenticate_user(db, username: str, password: str):
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
-    expire = datetime.now() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    # JWT times are UTC epoch seconds; iat lets revoked users' older tokens be rejected
+    issued_at = datetime.now(timezone.utc)
+    expire = issued_at + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"exp": expire, "iat": issued_at})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_access_token(token: str) -> Optional[dict]:
+    """
+    Verify a JWT's signature and expiry and check it against the revocation list.
+    Returns the payload, or None if the token is invalid, expired or revoked.
+    No database access is needed.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if token_revocations.is_revoked(token, payload):
+        return None
+    return payload
+
 def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_db)):
     """Get the current authenticated user from a JWT token."""
     credentials_exception = HTTPException(
@@ -56,14 +73,11 @@ def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_db)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
+    payload = decode_access_token(token)
+    username = payload.get("sub") if payload else None
+    if username is None:
         raise credentials_exception
+    token_data = TokenData(username=username)
     user = crud.get_user_by_username(db, username=token_data.username)
     if user is None:
         raise credentials_exception
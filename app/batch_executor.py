@@ -0,0 +1,351 @@
+"""
+Parallel populate (and optional publish) of many SQL scripts for the DQX application.
+
+A batch job takes a set of script ids (or all scripts) and runs
+crud.populate_script_result_table, then optionally crud.publish_script_results,
+for each of them on a bounded pool of BATCH_MAX_WORKERS threads. Each script
+checks out its own pooled connection for the duration of its run.
+
+Concurrency is also capped per database connection, counted in pooled
+connections: a script takes one for itself plus one per populate slice
+(crud.populate_slices), and only starts once that many are free. The cap is
+BATCH_CONNECTION_LIMIT (per-connection overrides in BATCH_CONNECTION_LIMITS) and
+never more than the pool's max_size minus BATCH_POOL_RESERVE, which stays free
+for HTTP requests and the audit log writer. A script needing more than the cap
+runs alone. Scripts all run on the application database ("default") today. Publishes write
+the shared dq.bad_detail table and additionally take one of
+BATCH_PUBLISH_CONCURRENCY slots (1 by default, so publishes do not contend for
+the same rows).
+
+With on_error="fail_fast" the first failure stops the job: scripts that have
+not started are skipped, running ones finish. With "continue" every script
+runs. Jobs are polled by id for aggregate progress; the last BATCH_JOB_HISTORY
+jobs are kept in memory (per worker process).
+
+On application shutdown queued scripts are skipped and running ones get up to
+BATCH_SHUTDOWN_TIMEOUT seconds to finish; scripts still running after that are
+logged and abandoned (their transactions roll back when the pool closes).
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app import crud
+from app.database import db_pool
+
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "4"))
+BATCH_CONNECTION_LIMIT = int(os.getenv("BATCH_CONNECTION_LIMIT", "4"))
+BATCH_CONNECTION_LIMITS = os.getenv("BATCH_CONNECTION_LIMITS", "")  # e.g. "default=6"
+BATCH_POOL_RESERVE = int(os.getenv("BATCH_POOL_RESERVE", "3"))  # db_pool connections batches never use
+BATCH_PUBLISH_CONCURRENCY = int(os.getenv("BATCH_PUBLISH_CONCURRENCY", "1"))
+BATCH_JOB_HISTORY = int(os.getenv("BATCH_JOB_HISTORY", "50"))
+BATCH_SHUTDOWN_TIMEOUT = float(os.getenv("BATCH_SHUTDOWN_TIMEOUT", "30"))
+
+ERROR_POLICIES = ("continue", "fail_fast")
+
+# Connection id scripts run on: the application database (db_pool)
+TARGET_CONNECTION_ID = "default"
+
+
+def _parse_limits(value: str) -> Dict[str, int]:
+    """Parse "conn_id=n,conn_id=n" into a dict."""
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            conn_id, limit = item.split("=", 1)
+            limits[conn_id.strip()] = max(1, int(limit))
+    return limits
+
+
+class _WeightedSemaphore:
+    """Semaphore whose holders take several permits at once (clamped to the capacity)."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._available = capacity
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def acquire(self, permits: int):
+        permits = max(1, min(permits, self.capacity))
+        with self._cond:
+            self._cond.wait_for(lambda: self._available >= permits)
+            self._available -= permits
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._available += permits
+                self._cond.notify_all()
+
+    @property
+    def in_use(self) -> int:
+        with self._cond:
+            return self.capacity - self._available
+
+
+class BatchJob:
+    """Progress and per-script results of one batch run."""
+
+    def __init__(self, script_ids: List[int], publish: bool, publish_mode: str, full_refresh: bool,
+                 on_error: str, username: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.script_ids = script_ids
+        self.publish = publish
+        self.publish_mode = publish_mode
+        self.full_refresh = full_refresh
+        self.on_error = on_error
+        self.username = username
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.cancel_requested = False
+        self.scripts: Dict[int, Dict[str, Any]] = {
+            script_id: {"status": "pending", "connections": 1, "populate": None, "publish": None, "error": None,
+                        "duration_seconds": None}
+            for script_id in script_ids
+        }
+        self._remaining = len(script_ids)
+        self._started = time.monotonic()
+        self._duration: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def update(self, script_id: int, **fields):
+        with self._lock:
+            self.scripts[script_id].update(fields)
+
+    def finish_script(self, script_id: int, status: str, **fields):
+        """Record a script's final status; returns True when it was the job's last script."""
+        with self._lock:
+            self.scripts[script_id].update(fields, status=status)
+            if status == "failed" and self.on_error == "fail_fast":
+                self.cancel_requested = True
+            self._remaining -= 1
+            if self._remaining == 0:
+                self.finished_at = datetime.now()
+                self._duration = time.monotonic() - self._started
+            return self._remaining == 0
+
+    @property
+    def status(self) -> str:
+        counts = self._counts()
+        if self._remaining:
+            return "cancelling" if self.cancel_requested else "running"
+        if counts["failed"]:
+            return "failed"
+        if counts["skipped"]:
+            return "cancelled"
+        return "completed"
+
+    def _counts(self) -> Dict[str, int]:
+        counts = {"pending": 0, "running": 0, "succeeded": 0, "failed": 0, "skipped": 0}
+        for entry in self.scripts.values():
+            counts[entry["status"]] += 1
+        return counts
+
+    def to_dict(self, include_scripts: bool = True) -> Dict[str, Any]:
+        with self._lock:
+            counts = self._counts()
+            done = counts["succeeded"] + counts["failed"] + counts["skipped"]
+            job = {
+                "job_id": self.id,
+                "status": self.status,
+                "total": len(self.script_ids),
+                **counts,
+                "progress": round(done / len(self.script_ids), 3) if self.script_ids else 1.0,
+                "publish": self.publish,
+                "publish_mode": self.publish_mode if self.publish else None,
+                "full_refresh": self.full_refresh,
+                "on_error": self.on_error,
+                "username": self.username,
+                "created_at": self.created_at.isoformat(),
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "duration_seconds": round(self._duration if self._duration is not None
+                                          else time.monotonic() - self._started, 3),
+            }
+            if include_scripts:
+                job["scripts"] = [{"script_id": script_id, **entry} for script_id, entry in self.scripts.items()]
+            return job
+
+
+class BatchExecutor:
+    """Bounded worker pool running batch jobs with per-connection and publish concurrency caps."""
+
+    def __init__(self, pool, max_workers: int = BATCH_MAX_WORKERS, connection_limit: int = BATCH_CONNECTION_LIMIT,
+                 connection_limits: Optional[Dict[str, int]] = None,
+                 publish_concurrency: int = BATCH_PUBLISH_CONCURRENCY, history: int = BATCH_JOB_HISTORY,
+                 pool_reserve: int = BATCH_POOL_RESERVE):
+        self.pool = pool
+        self.pool_reserve = max(0, pool_reserve)
+        self.max_workers = max(1, max_workers)
+        self.connection_limit = max(1, connection_limit)
+        self.connection_limits = connection_limits if connection_limits is not None else _parse_limits(BATCH_CONNECTION_LIMITS)
+        self.publish_concurrency = max(1, publish_concurrency)
+        self.history = max(1, history)
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: "set[Future]" = set()
+        self._jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+        self._semaphores: Dict[str, _WeightedSemaphore] = {}
+        self._publish_slots = threading.BoundedSemaphore(self.publish_concurrency)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    # ------------------------------------------------------------------
+    # Jobs
+    # ------------------------------------------------------------------
+
+    def submit(self, script_ids: List[int], publish: bool = False, publish_mode: str = "auto",
+               full_refresh: bool = False, on_error: str = "continue", username: Optional[str] = None) -> BatchJob:
+        """Queue a job for the given scripts (duplicates removed, order kept) and return it."""
+        if on_error not in ERROR_POLICIES:
+            raise ValueError(f"Invalid error policy '{on_error}'. Use one of {ERROR_POLICIES}.")
+        if publish and publish_mode not in crud.PUBLISH_MODES:
+            raise ValueError(f"Invalid publish mode '{publish_mode}'. Use one of {crud.PUBLISH_MODES}.")
+        script_ids = list(dict.fromkeys(script_ids))
+        if not script_ids:
+            raise ValueError("No scripts to run.")
+
+        job = BatchJob(script_ids, publish, publish_mode, full_refresh, on_error, username)
+        with self.pool.connection() as db:
+            slices = crud.get_script_slices(db, script_ids)
+        for script_id in script_ids:
+            # Its own connection plus one per populate slice
+            job.scripts[script_id]["connections"] = 1 + (slices[script_id] if slices[script_id] > 1 else 0)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Batch executor is shut down")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dq-batch")
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.finished_at is None:
+                    break  # never forget a running job
+                self._jobs.popitem(last=False)
+            for script_id in script_ids:
+                future = self._executor.submit(self._run_script, job, script_id)
+                self._futures.add(future)
+                future.add_done_callback(self._forget_future)
+        print(f"Batch job {job.id}: {len(script_ids)} scripts queued (publish={publish}, on_error={on_error})")
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict(include_scripts=False) for job in reversed(jobs)]
+
+    def cancel(self, job_id: str) -> Optional[BatchJob]:
+        """Skip a job's scripts that have not started yet; running ones finish."""
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel_requested = True
+        return job
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def _connection_capacity(self, conn_id: str) -> int:
+        limit = self.connection_limits.get(conn_id, self.connection_limit)
+        return max(1, min(limit, self.pool.max_size - self.pool_reserve))
+
+    def _connection_slots(self, conn_id: str) -> _WeightedSemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(conn_id)
+            if semaphore is None:
+                semaphore = self._semaphores[conn_id] = _WeightedSemaphore(self._connection_capacity(conn_id))
+            return semaphore
+
+    def _run_script(self, job: BatchJob, script_id: int):
+        if job.cancel_requested:
+            self._finish(job, script_id, "skipped")
+            return
+        slots = self._connection_slots(TARGET_CONNECTION_ID)
+        with slots.acquire(job.scripts[script_id]["connections"]):
+            if job.cancel_requested:
+                self._finish(job, script_id, "skipped")
+                return
+            job.update(script_id, status="running")
+            started = time.monotonic()
+            try:
+                with self.pool.connection() as db:
+                    populate = crud.populate_script_result_table(db, script_id, full_refresh=job.full_refresh)
+                    job.update(script_id, populate=populate)
+                    if job.publish:
+                        with self._publish_slots:
+                            publish = crud.publish_script_results(db, script_id, mode=job.publish_mode)
+                        job.update(script_id, publish=publish)
+            except Exception as e:
+                print(f"Batch job {job.id}: script {script_id} failed: {e}")
+                self._finish(job, script_id, "failed", error=str(e),
+                             duration_seconds=round(time.monotonic() - started, 3))
+                return
+            self._finish(job, script_id, "succeeded", duration_seconds=round(time.monotonic() - started, 3))
+
+    def _forget_future(self, future: Future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def _finish(self, job: BatchJob, script_id: int, status: str, **fields):
+        if job.finish_script(script_id, status, **fields):
+            summary = job.to_dict(include_scripts=False)
+            print(f"Batch job {job.id} {summary['status']}: {summary['succeeded']} succeeded, "
+                  f"{summary['failed']} failed, {summary['skipped']} skipped in {summary['duration_seconds']}s")
+
+    # ------------------------------------------------------------------
+    # Lifecycle and stats
+    # ------------------------------------------------------------------
+
+    def shutdown(self, timeout: float = BATCH_SHUTDOWN_TIMEOUT):
+        """Stop accepting jobs, skip queued scripts and wait up to timeout seconds for running ones.
+
+        Blocking; call it from a thread (asyncio.to_thread) in async code. Scripts still
+        running when the timeout expires are logged and left to their worker threads.
+        """
+        with self._lock:
+            self._closed = True
+            executor = self._executor
+            futures = set(self._futures)
+            jobs = list(self._jobs.values())
+            for job in jobs:
+                job.cancel_requested = True
+        if executor is None:
+            return
+        executor.shutdown(wait=False)
+        wait(futures, timeout=timeout)
+        for job in jobs:
+            with job._lock:
+                running = [script_id for script_id, script in job.scripts.items() if script["status"] == "running"]
+            if running:
+                print(f"Batch job {job.id}: abandoning scripts {running} still running after {timeout}s at shutdown")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+            limits = {conn_id: self._connection_capacity(conn_id)
+                      for conn_id in set(self._semaphores) | set(self.connection_limits) | {TARGET_CONNECTION_ID}}
+            in_use = {conn_id: semaphore.in_use for conn_id, semaphore in self._semaphores.items()}
+        return {
+            "max_workers": self.max_workers,
+            "connection_limits": limits,
+            "connections_in_use": in_use,
+            "pool_reserve": self.pool_reserve,
+            "publish_concurrency": self.publish_concurrency,
+            "jobs": len(jobs),
+            "running_jobs": sum(1 for job in jobs if job.finished_at is None),
+        }
+
+
+# Global instance used by the /api/scripts/batch routes
+batch_executor = BatchExecutor(db_pool)
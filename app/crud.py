@@ -4,13 +4,24 @@ Handles database operations for SQL scripts, table management, and execution.
 """
 
 import psycopg2
+import psycopg2.errors
+import hashlib
 import json
 import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
 from decimal import Decimal
 from typing import Any, Dict, List, Optional
 import re
 
+from app.database import db_pool
+from app.serialization import ResultSerializer
+from app.result_cache import DATA_VERSIONS_QUERY, cache_key, result_cache
+from app.single_flight import query_flight
+
 # Import user CRUD operations
 from app.user_crud import (
     create_user,
@@ -162,12 +173,54 @@ def get_script_count(db) -> int:
         return 0
 
 
+BAD_DETAIL_COUNT_QUERY = "SELECT COUNT(*) FROM dq.bad_detail"
+
+
+def _sync_cache_versions(db, query: str):
+    """Pick up data versions bumped by other processes (dq.data_versions) before using the cache."""
+    tables = result_cache.tables_to_check(query)
+    if not tables:
+        return
+    try:
+        with db.cursor() as cursor:
+            cursor.execute(DATA_VERSIONS_QUERY, (list(tables),))
+            result_cache.sync_versions(tables, dict(cursor.fetchall()))
+    except psycopg2.errors.UndefinedTable:
+        db.rollback()
+        result_cache.disable_shared_versions()
+
+
+def bump_data_version(db, table_name: str):
+    """
+    Drop this process's cached results for a table and bump its shared data version
+    (sequence dq.<table>_data_version) for the other processes. Call after committing
+    the change: the trigger bumps happen before commit, so this one makes sure no reader
+    keeps rows from before the change. nextval runs in its own short transaction and
+    takes no row lock; without the sequence it is a no-op.
+    """
+    result_cache.bump(table_name)
+    try:
+        with db.cursor() as cursor:
+            cursor.execute("SELECT nextval(to_regclass(%s));", (f"{table_name}_data_version",))
+        db.commit()
+    except psycopg2.Error as e:
+        db.rollback()
+        print(f"Error bumping the data version of {table_name}: {str(e)}")
+
+
 def get_bad_detail_count(db) -> int:
-    """Get the total number of records in the bad_detail table."""
+    """Get the total number of records in the bad_detail table (cached until the next publish)."""
+    _sync_cache_versions(db, BAD_DETAIL_COUNT_QUERY)
+    cached = result_cache.get(BAD_DETAIL_COUNT_QUERY)
+    if cached is not None:
+        return cached
     try:
+        stamp = result_cache.stamp(BAD_DETAIL_COUNT_QUERY)
         with db.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) FROM dq.bad_detail")
-            return cursor.fetchone()[0]
+            cursor.execute(BAD_DETAIL_COUNT_QUERY)
+            count = cursor.fetchone()[0]
+        result_cache.set(BAD_DETAIL_COUNT_QUERY, None, count, stamp)
+        return count
     except Exception as e:
         print(f"Error getting bad_detail count: {str(e)}")
         return 0
@@ -340,8 +393,9 @@ def _create_staging_table(cursor, script_id: int, script_content: str):
     if clean_script_content.endswith(';'):
         clean_script_content = clean_script_content[:-1]
 
-    # Create the table
-    create_table_query = f"CREATE TABLE stg.{stg_table_name_str} AS ({clean_script_content}) WITH NO DATA;"
+    # Create the table (replaced by the first populate, which applies the script's settings)
+    unlogged = "UNLOGGED " if STAGING_UNLOGGED else ""
+    create_table_query = f"CREATE {unlogged}TABLE stg.{stg_table_name_str} AS ({clean_script_content}) WITH NO DATA;"
     cursor.execute(create_table_query)
 
 
@@ -426,9 +480,332 @@ def delete_sql_script(db, script_id: int) -> Dict[str, Any]:
             cursor.close()
 
 
-def populate_script_result_table(db, script_id: int) -> Dict[str, Any]:
-    """Execute a SQL script and insert the results into its dedicated staging table."""
+# ========================================================================================
+# SCRIPT SETTINGS (INCREMENTAL POPULATE)
+# ========================================================================================
+
+# Defaults for scripts without a dq.dq_script_settings row (full populate/publish)
+DEFAULT_SCRIPT_SETTINGS = {
+    "incremental": False,
+    "watermark_column": "txn_date",
+    "watermark_value": None,
+    "published_watermark": None,
+    "watermark_updated_at": None,
+    "unlogged": None,  # None: STAGING_UNLOGGED for full-refresh scripts, logged for incremental ones
+    "slices": 1,  # full populate runs the script as this many hash slices in parallel
+    "slice_column": "source_uid",
+}
+
+# Staging tables are rebuilt on every populate, so by default they skip WAL
+STAGING_UNLOGGED = os.getenv("STAGING_UNLOGGED", "true").lower() in ("1", "true", "yes")
+
+PUBLISH_MODES = ("auto", "full", "incremental", "delta", "chunked")
+
+# How long partition and staging-table swaps and publish batches wait for locks before giving up
+# (readers are never queued behind them for longer)
+PUBLISH_LOCK_TIMEOUT_MS = int(os.getenv("PUBLISH_LOCK_TIMEOUT_MS", "5000"))
+
+# Keys ((rule_id, source_id) pairs) replaced per transaction by the chunked publish
+PUBLISH_BATCH_KEYS = int(os.getenv("PUBLISH_BATCH_KEYS", "500"))
+
+# Upper bound for a script's populate slices; each slice holds a db_pool connection
+POPULATE_MAX_SLICES = int(os.getenv("POPULATE_MAX_SLICES", "8"))
+
+# db_pool connections held by the slices of all running populates together (on top of
+# each populate's own connection); the rest of the pool stays free for HTTP requests.
+# Slices beyond it wait for a free slot.
+POPULATE_SLICE_CONNECTIONS = max(1, int(os.getenv("POPULATE_SLICE_CONNECTIONS", str(db_pool.max_size // 2))))
+_slice_connections = threading.BoundedSemaphore(POPULATE_SLICE_CONNECTIONS)
+
+
+def populate_slices(settings: Dict[str, Any]) -> int:
+    """Number of slices a full populate of a script runs as (1 = not sliced)."""
+    return max(1, min(settings.get("slices") or 1, POPULATE_MAX_SLICES, POPULATE_SLICE_CONNECTIONS))
+
+
+def get_script_settings(db, script_id: int) -> Dict[str, Any]:
+    """Get the populate/publish settings of a script (defaults if none are stored)."""
+    settings = dict(DEFAULT_SCRIPT_SETTINGS, script_id=script_id)
+    cursor = None
+    try:
+        cursor = db.cursor()
+        # SELECT * so databases missing newer columns still get defaults for them
+        cursor.execute("SELECT * FROM dq.dq_script_settings WHERE script_id = %s;", (script_id,))
+        row = cursor.fetchone()
+        if row:
+            settings.update(zip([desc[0] for desc in cursor.description], row))
+    except psycopg2.errors.UndefinedTable:
+        # Table not migrated yet: every script runs in full mode
+        db.rollback()
+        print("dq.dq_script_settings not found; run incremental_populate_migration.sql to enable incremental populate")
+    finally:
+        if cursor:
+            cursor.close()
+    return settings
+
+
+def get_script_slices(db, script_ids: List[int]) -> Dict[int, int]:
+    """Number of slices a full populate runs as (populate_slices) for each of the scripts."""
+    slices = {script_id: 1 for script_id in script_ids}
     cursor = None
+    try:
+        cursor = db.cursor()
+        cursor.execute("SELECT * FROM dq.dq_script_settings WHERE script_id = ANY(%s);", (list(script_ids),))
+        columns = [desc[0] for desc in cursor.description]
+        for row in cursor.fetchall():
+            settings = dict(zip(columns, row))
+            slices[settings["script_id"]] = populate_slices(settings)
+    except psycopg2.errors.UndefinedTable:
+        db.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+    return slices
+
+
+def update_script_settings(db, script_id: int, settings_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Create or update a script's settings. Changing the watermark column resets the
+    watermarks, so the next populate and publish run in full.
+    """
+    current = get_script_settings(db, script_id)
+    incremental = settings_data.get("incremental")
+    if incremental is None:
+        incremental = current["incremental"]
+    watermark_column = (settings_data.get("watermark_column") or current["watermark_column"]).lower()
+    if watermark_column not in REQUIRED_COLUMNS:
+        raise ValueError(f"Watermark column must be one of the script columns: {sorted(REQUIRED_COLUMNS)}")
+    # Explicit None restores the default
+    unlogged = settings_data["unlogged"] if "unlogged" in settings_data else current["unlogged"]
+    slices = settings_data.get("slices") or current["slices"] or 1
+    if not 1 <= slices <= POPULATE_MAX_SLICES:
+        raise ValueError(f"Slices must be between 1 and {POPULATE_MAX_SLICES}.")
+    slice_column = (settings_data.get("slice_column") or current["slice_column"]).lower()
+    if slice_column not in REQUIRED_COLUMNS:
+        raise ValueError(f"Slice column must be one of the script columns: {sorted(REQUIRED_COLUMNS)}")
+
+    cursor = None
+    try:
+        cursor = db.cursor()
+        cursor.execute("""
+            INSERT INTO dq.dq_script_settings (script_id, incremental, watermark_column, unlogged, slices, slice_column)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (script_id) DO UPDATE SET
+                incremental = EXCLUDED.incremental,
+                unlogged = EXCLUDED.unlogged,
+                slices = EXCLUDED.slices,
+                slice_column = EXCLUDED.slice_column,
+                watermark_column = EXCLUDED.watermark_column,
+                watermark_value = CASE WHEN dq_script_settings.watermark_column = EXCLUDED.watermark_column
+                                       THEN dq_script_settings.watermark_value END,
+                published_watermark = CASE WHEN dq_script_settings.watermark_column = EXCLUDED.watermark_column
+                                           THEN dq_script_settings.published_watermark END,
+                updated_at = CURRENT_TIMESTAMP;
+        """, (script_id, incremental, watermark_column, unlogged, slices, slice_column))
+        db.commit()
+    except Exception:
+        if db:
+            db.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+    return get_script_settings(db, script_id)
+
+
+def reset_script_watermark(db, script_id: int) -> Dict[str, Any]:
+    """Clear a script's watermarks; the next populate and publish run in full."""
+    cursor = None
+    try:
+        cursor = db.cursor()
+        cursor.execute("""
+            UPDATE dq.dq_script_settings
+            SET watermark_value = NULL, published_watermark = NULL, watermark_updated_at = CURRENT_TIMESTAMP
+            WHERE script_id = %s;
+        """, (script_id,))
+        db.commit()
+    except Exception:
+        if db:
+            db.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+    return get_script_settings(db, script_id)
+
+
+def _staging_unlogged(settings: Dict[str, Any]) -> bool:
+    """
+    Whether the script's staging table is UNLOGGED. Incremental staging accumulates rows
+    across runs, and an unlogged table is emptied after a crash, so it stays logged unless
+    set explicitly.
+    """
+    if settings.get("unlogged") is not None:
+        return settings["unlogged"]
+    return STAGING_UNLOGGED and not settings["incremental"]
+
+
+def _wal_lsn(cursor) -> Optional[str]:
+    # pg_current_wal_lsn() fails on a standby
+    cursor.execute("SELECT CASE WHEN pg_is_in_recovery() THEN NULL ELSE pg_current_wal_lsn()::text END;")
+    return cursor.fetchone()[0]
+
+
+def _wal_bytes_since(cursor, start_lsn: Optional[str]) -> Optional[int]:
+    """WAL written since start_lsn by the whole cluster (so approximate on a busy server)."""
+    end_lsn = _wal_lsn(cursor)
+    if start_lsn is None or end_lsn is None:
+        return None
+    cursor.execute("SELECT pg_wal_lsn_diff(%s::pg_lsn, %s::pg_lsn)::bigint;", (end_lsn, start_lsn))
+    return cursor.fetchone()[0]
+
+
+def _save_watermarks(cursor, script_id: int, watermark_value: Optional[str], published_watermark: Optional[str]):
+    cursor.execute("""
+        UPDATE dq.dq_script_settings
+        SET watermark_value = %s, published_watermark = %s, watermark_updated_at = CURRENT_TIMESTAMP
+        WHERE script_id = %s;
+    """, (watermark_value, published_watermark, script_id))
+
+
+def _slice_query(script_sql: str, slice_column: str, slices: int, index: int) -> str:
+    """
+    The script restricted to one hash slice of slice_column. Rows with a NULL slice key
+    go to slice 0, so the slices are disjoint and together cover every row.
+    """
+    # slice_column is one of REQUIRED_COLUMNS, so it is a safe identifier
+    predicate = f"(hashtext(src.{slice_column}::text) & 2147483647) % {int(slices)} = {int(index)}"
+    if index == 0:
+        predicate = f"({predicate} OR src.{slice_column} IS NULL)"
+    return f"SELECT * FROM ({script_sql}) AS src WHERE {predicate}"
+
+
+def _populate_slice(table: str, script_sql: str, slice_column: str, slices: int, index: int) -> Dict[str, Any]:
+    started = time.monotonic()
+    with _slice_connections, db_pool.connection() as conn:
+        wait_ms = round((time.monotonic() - started) * 1000, 1)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"INSERT INTO stg.{table} {_slice_query(script_sql, slice_column, slices, index)};")
+            rows = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    return {"slice": index, "rows": rows, "duration_seconds": round(time.monotonic() - started, 3),
+            "wait_ms": wait_ms}
+
+
+def _populate_slices(table: str, script_sql: str, slice_column: str, slices: int) -> List[Dict[str, Any]]:
+    """
+    Run the script as `slices` hash slices, each inserting into stg.<table> on its own
+    pooled connection (one of POPULATE_SLICE_CONNECTIONS). Waits for every slice and
+    raises the first failure.
+    """
+    with ThreadPoolExecutor(max_workers=slices, thread_name_prefix="dq-slice") as executor:
+        futures = [executor.submit(_populate_slice, table, script_sql, slice_column, slices, index)
+                   for index in range(slices)]
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        raise errors[0]
+    return [future.result() for future in futures]
+
+
+def verify_sliced_populate(db, script_id: int, slices: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Check that running a script as hash slices returns exactly the rows of the unsliced
+    script (as multisets, with EXCEPT ALL both ways). Runs the script twice in a
+    read-only transaction that is rolled back; nothing is written.
+    """
+    script_info = get_sql_script(db, script_id)
+    if not script_info or 'content' not in script_info:
+        raise ValueError(f"Script with ID {script_id} not found.")
+    settings = get_script_settings(db, script_id)
+    slices = slices or settings["slices"]
+    if not 2 <= slices <= POPULATE_MAX_SLICES:
+        raise ValueError(f"Slices must be between 2 and {POPULATE_MAX_SLICES}.")
+    slice_column = settings["slice_column"]
+
+    script_sql = script_info['content'].strip().rstrip(';')
+    sliced_sql = " UNION ALL ".join(
+        f"({_slice_query(script_sql, slice_column, slices, index)})" for index in range(slices)
+    )
+    cursor = None
+    try:
+        cursor = db.cursor()
+        cursor.execute("SET TRANSACTION READ ONLY;")
+        cursor.execute(f"""
+            WITH unsliced AS ({script_sql}),
+                 sliced AS ({sliced_sql})
+            SELECT (SELECT count(*) FROM unsliced),
+                   (SELECT count(*) FROM sliced),
+                   (SELECT count(*) FROM (SELECT * FROM unsliced EXCEPT ALL SELECT * FROM sliced) AS missing),
+                   (SELECT count(*) FROM (SELECT * FROM sliced EXCEPT ALL SELECT * FROM unsliced) AS extra);
+        """)
+        unsliced_rows, sliced_rows, missing_rows, extra_rows = cursor.fetchone()
+    finally:
+        if cursor:
+            cursor.close()
+        db.rollback()
+
+    return {
+        "script_id": script_id,
+        "slices": slices,
+        "slice_column": slice_column,
+        "unsliced_rows": unsliced_rows,
+        "sliced_rows": sliced_rows,
+        "missing_rows": missing_rows,
+        "extra_rows": extra_rows,
+        "matches": missing_rows == 0 and extra_rows == 0,
+    }
+
+
+# ========================================================================================
+# POPULATE AND PUBLISH
+# ========================================================================================
+
+def _drop_staging_tables_async(table_names: List[str]):
+    """Drop replaced staging tables on a pooled connection in the background."""
+    def drop():
+        try:
+            with db_pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    for table_name in table_names:
+                        # Waits for readers that still use the old table, without blocking anyone else
+                        cursor.execute(f"DROP TABLE IF EXISTS stg.{table_name};")
+                        conn.commit()
+        except Exception as e:
+            print(f"Error dropping old staging tables {table_names}: {str(e)}")
+
+    if table_names:
+        threading.Thread(target=drop, name="stg-table-drop", daemon=True).start()
+
+
+def populate_script_result_table(db, script_id: int, full_refresh: bool = False) -> Dict[str, Any]:
+    """
+    Execute a SQL script and load the results into its dedicated staging table.
+
+    A full populate builds stg.dq_script_<id>__next, ANALYZEs it and renames it into
+    place in one short transaction; the replaced table is dropped in the background.
+    Readers of the staging table are not blocked while the script runs, and a failed
+    populate leaves the previous results intact. Staging tables are UNLOGGED unless the
+    script's settings say otherwise, and get an index on (rule_id, source_id) plus fresh
+    statistics for the publish step. The result reports the duration and WAL written.
+
+    Scripts with incremental settings and a stored watermark instead append, in place,
+    only rows whose watermark column is above it (the bound is passed as a bind parameter
+    on the script wrapped as a subquery) and advance the watermark. full_refresh, or a
+    reset watermark, reloads everything.
+
+    A full populate of a script with slices > 1 creates the shadow table empty and fills
+    it with that many hash slices of slice_column (see _slice_query) in parallel, each on
+    its own pooled connection; the result lists each slice's rows and duration.
+    """
+    cursor = None
+    next_table = None
+    started = time.monotonic()
     try:
         # Get the script content
         script_info = get_sql_script(db, script_id)
@@ -437,14 +814,16 @@ def populate_script_result_table(db, script_id: int) -> Dict[str, Any]:
         
         script_content = script_info['content']
         stg_table_name_str = _get_stg_table_name_str(script_id)
+        settings = get_script_settings(db, script_id)
         
         clean_script_content = script_content.strip()
         if clean_script_content.endswith(';'):
             clean_script_content = clean_script_content[:-1]
 
         cursor = db.cursor()
+        start_lsn = _wal_lsn(cursor)
+        index_name = f"{stg_table_name_str}_rule_source_idx"
 
-        # Ensure the staging table exists
         cursor.execute("""
             SELECT EXISTS (
                 SELECT FROM information_schema.tables 
@@ -453,33 +832,178 @@ def populate_script_result_table(db, script_id: int) -> Dict[str, Any]:
         """, ('stg', stg_table_name_str))
         table_exists = cursor.fetchone()[0]
 
-        if not table_exists:
-            create_table_query = f"CREATE TABLE stg.{stg_table_name_str} AS ({clean_script_content}) WITH NO DATA;"
-            cursor.execute(create_table_query)
+        incremental = (settings["incremental"] and not full_refresh and table_exists
+                       and settings["watermark_value"] is not None)
+        # Watermark column is one of REQUIRED_COLUMNS, so it is a safe identifier
+        watermark_column = settings["watermark_column"]
+
+        if incremental:
+            script_sql = clean_script_content.replace('%', '%%')  # literal % in the script once params are bound
+            cursor.execute(f"""
+                WITH inserted AS (
+                    INSERT INTO stg.{stg_table_name_str}
+                    SELECT * FROM ({script_sql}) AS src WHERE src.{watermark_column} > %s
+                    RETURNING {watermark_column}
+                )
+                SELECT count(*), max({watermark_column})::text FROM inserted;
+            """, (settings["watermark_value"],))
+            inserted_rows, loaded_max = cursor.fetchone()
+            watermark_value = loaded_max or settings["watermark_value"]
+            _save_watermarks(cursor, script_id, watermark_value, settings["published_watermark"])
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON stg.{stg_table_name_str} (rule_id, source_id);")
+            cursor.execute(f"ANALYZE stg.{stg_table_name_str};")
+            wal_bytes = _wal_bytes_since(cursor, start_lsn)
+
+            db.commit()
+
+            return {
+                "success": True,
+                "inserted_rows": inserted_rows,
+                "table": f"stg.{stg_table_name_str}",
+                "mode": "incremental",
+                "watermark": watermark_value,
+                "duration_seconds": round(time.monotonic() - started, 3),
+                "wal_bytes": wal_bytes,
+            }
+
+        # Full populate: load a shadow table while the current one stays readable
+        next_table = f"{stg_table_name_str}__next"
+        unlogged = _staging_unlogged(settings)
+        slices = populate_slices(settings)
+        cursor.execute(f"DROP TABLE IF EXISTS stg.{next_table};")
+        slice_results = None
+        if slices > 1:
+            cursor.execute(f"CREATE {'UNLOGGED ' if unlogged else ''}TABLE stg.{next_table} AS ({clean_script_content}) WITH NO DATA;")
+            db.commit()  # the slice connections need to see the table
+            slice_results = _populate_slices(next_table, clean_script_content, settings["slice_column"], slices)
+            inserted_rows = sum(result["rows"] for result in slice_results)
         else:
-            truncate_query = f"TRUNCATE TABLE stg.{stg_table_name_str};"
-            cursor.execute(truncate_query)
+            cursor.execute(f"CREATE {'UNLOGGED ' if unlogged else ''}TABLE stg.{next_table} AS ({clean_script_content});")
+            inserted_rows = cursor.rowcount
+        cursor.execute(f"CREATE INDEX {next_table}_rule_source_idx ON stg.{next_table} (rule_id, source_id);")
+        cursor.execute(f"ANALYZE stg.{next_table};")
+        # A logged load would have written roughly the table and index size to WAL
+        cursor.execute("SELECT pg_total_relation_size(%s::regclass);", (f"stg.{next_table}",))
+        table_bytes = cursor.fetchone()[0]
+        watermark_value = None
+        if settings["incremental"]:
+            cursor.execute(f"SELECT max({watermark_column})::text FROM stg.{next_table};")
+            watermark_value = cursor.fetchone()[0]
+        db.commit()
 
-        # Insert data
-        insert_query = f"INSERT INTO stg.{stg_table_name_str} {clean_script_content};"
-        cursor.execute(insert_query)
-        inserted_rows = cursor.rowcount
-        
+        # Old versions left behind by earlier runs (e.g. a restart before the background drop)
+        cursor.execute(
+            "SELECT tablename FROM pg_tables WHERE schemaname = 'stg' AND tablename LIKE %s;",
+            (stg_table_name_str.replace('_', r'\_') + r'\_\_old\_%',)
+        )
+        old_tables = [row[0] for row in cursor.fetchall()]
+
+        # Swap: two renames in one short transaction
+        cursor.execute(f"SET LOCAL lock_timeout = {int(PUBLISH_LOCK_TIMEOUT_MS)};")
+        if table_exists:
+            old_table = f"{stg_table_name_str}__old_{int(time.time() * 1000)}"
+            cursor.execute(f"ALTER TABLE stg.{stg_table_name_str} RENAME TO {old_table};")
+            cursor.execute(f"ALTER INDEX IF EXISTS stg.{index_name} RENAME TO {old_table}_rule_source_idx;")
+            old_tables.append(old_table)
+        cursor.execute(f"ALTER TABLE stg.{next_table} RENAME TO {stg_table_name_str};")
+        cursor.execute(f"ALTER INDEX stg.{next_table}_rule_source_idx RENAME TO {index_name};")
+        if settings["incremental"]:
+            # Staging was reloaded from scratch: the next publish has to be a full one
+            _save_watermarks(cursor, script_id, watermark_value, None)
+        wal_bytes = _wal_bytes_since(cursor, start_lsn)
         db.commit()
-        
-        return {"success": True, "inserted_rows": inserted_rows, "table": f"stg.{stg_table_name_str}"}
+        next_table = None
+
+        _drop_staging_tables_async(old_tables)
 
+        result = {
+            "success": True,
+            "inserted_rows": inserted_rows,
+            "table": f"stg.{stg_table_name_str}",
+            "mode": "full",
+            "unlogged": unlogged,
+            "duration_seconds": round(time.monotonic() - started, 3),
+            "wal_bytes": wal_bytes,
+            "wal_bytes_saved": table_bytes if unlogged else 0,
+        }
+        if settings["incremental"]:
+            result["watermark"] = watermark_value
+        if slice_results is not None:
+            result["slice_column"] = settings["slice_column"]
+            result["slices"] = slice_results
+        return result
+
+    except psycopg2.errors.LockNotAvailable as e:
+        db.rollback()
+        raise ValueError(f"Could not swap in the new staging table within {PUBLISH_LOCK_TIMEOUT_MS} ms "
+                         f"(stg.{stg_table_name_str} is in use); the previous results are unchanged.") from e
     except Exception:
         if db: 
             db.rollback()
         raise
     finally:
+        if cursor and next_table:
+            try:
+                cursor.execute(f"DROP TABLE IF EXISTS stg.{next_table};")
+                db.commit()
+            except psycopg2.Error:
+                db.rollback()
         if cursor: 
             cursor.close()
 
 
-def publish_script_results(db, script_id: int) -> Dict[str, Any]:
-    """Publish results from a script's staging table to the central dq.bad_detail table."""
+def publish_script_results(db, script_id: int, mode: str = "auto", batch_size: Optional[int] = None,
+                           atomic: bool = False) -> Dict[str, Any]:
+    """
+    Publish results from a script's staging table to the central dq.bad_detail table.
+
+    mode "full" replaces every (rule_id, source_id) key found in staging (by partition
+    swap when dq.bad_detail is partitioned by rule_id). "incremental"
+    only publishes staging rows above the last published watermark and touches only
+    their keys. "delta" compares staging with the rows of its keys in bad_detail and only
+    deletes resolved rows and inserts new ones. "chunked" replaces keys batch_size at a
+    time, committing per batch unless atomic. "auto" picks incremental when the script
+    has a published watermark. Every result reports duration_seconds and wal_bytes.
+    """
+    if mode not in PUBLISH_MODES:
+        raise ValueError(f"Invalid publish mode '{mode}'. Use one of {PUBLISH_MODES}.")
+
+    settings = get_script_settings(db, script_id)
+    if mode == "auto":
+        mode = "incremental" if settings["incremental"] and settings["published_watermark"] is not None else "full"
+    if mode == "incremental" and (not settings["incremental"] or settings["published_watermark"] is None):
+        raise ValueError("Incremental publish needs an incremental script that has been published in full once.")
+
+    started = time.monotonic()
+    cursor = db.cursor()
+    try:
+        start_lsn = _wal_lsn(cursor)
+    finally:
+        cursor.close()
+
+    if mode == "incremental":
+        result = _publish_incremental(db, script_id, settings)
+    elif mode == "delta":
+        result = _publish_delta(db, script_id, settings)
+    elif mode == "chunked":
+        result = _publish_chunked(db, script_id, settings, batch_size or PUBLISH_BATCH_KEYS, atomic)
+    elif _bad_detail_is_partitioned(db):
+        result = _publish_partition_swap(db, script_id, settings)
+    else:
+        result = _publish_full(db, script_id, settings)
+
+    result.setdefault("duration_seconds", round(time.monotonic() - started, 3))
+    cursor = db.cursor()
+    try:
+        result["wal_bytes"] = _wal_bytes_since(cursor, start_lsn)
+    finally:
+        cursor.close()
+        db.rollback()  # end the read-only transaction opened above
+    return result
+
+
+def _publish_full(db, script_id: int, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace every (rule_id, source_id) key found in staging with DELETE + INSERT."""
     cursor = None
     stg_table_name_str = _get_stg_table_name_str(script_id)
     
@@ -507,9 +1031,14 @@ def publish_script_results(db, script_id: int) -> Dict[str, Any]:
         cursor.execute(insert_query)
         published_rows = cursor.rowcount
 
+        if settings["incremental"]:
+            _save_watermarks(cursor, script_id, settings["watermark_value"], settings["watermark_value"])
+
         db.commit()
+        bump_data_version(db, "dq.bad_detail")
 
-        return {"success": True, "published_rows": published_rows, "keys_replaced_count": len(keys_to_replace)}
+        return {"success": True, "published_rows": published_rows, "keys_replaced_count": len(keys_to_replace),
+                "mode": "full"}
 
     except Exception:
         if db: 
@@ -520,6 +1049,396 @@ def publish_script_results(db, script_id: int) -> Dict[str, Any]:
             cursor.close()
 
 
+def _publish_incremental(db, script_id: int, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Publish staging rows above the published watermark, replacing only those rows of their keys."""
+    cursor = None
+    stg_table_name_str = _get_stg_table_name_str(script_id)
+    watermark_column = settings["watermark_column"]
+    since = settings["published_watermark"]
+
+    try:
+        cursor = db.cursor()
+
+        cursor.execute(
+            f"SELECT DISTINCT rule_id, source_id FROM stg.{stg_table_name_str} WHERE {watermark_column} > %s;",
+            (since,)
+        )
+        affected_keys = cursor.fetchall()
+
+        if affected_keys:
+            # Rows above the mark for these keys are replaced, so publishing twice is harmless
+            cursor.execute(
+                f"DELETE FROM DQ.bad_detail WHERE (rule_id, source_id) IN %s AND {watermark_column} > %s;",
+                (tuple(affected_keys), since)
+            )
+            cursor.execute(f"""
+                INSERT INTO DQ.bad_detail (rule_id, source_id, source_uid, data_value, txn_date)
+                SELECT rule_id, source_id, source_uid, data_value, txn_date
+                FROM stg.{stg_table_name_str}
+                WHERE {watermark_column} > %s;
+            """, (since,))
+            published_rows = cursor.rowcount
+        else:
+            published_rows = 0
+
+        _save_watermarks(cursor, script_id, settings["watermark_value"], settings["watermark_value"])
+        db.commit()
+        if affected_keys:
+            bump_data_version(db, "dq.bad_detail")
+
+        return {"success": True, "published_rows": published_rows, "keys_replaced_count": len(affected_keys),
+                "mode": "incremental", "published_since": since, "watermark": settings["watermark_value"]}
+
+    except Exception:
+        if db:
+            db.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+
+
+def _publish_delta(db, script_id: int, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Publish only the differences between staging and the bad_detail rows of its
+    (rule_id, source_id) keys, compared on all five result columns. Rows reproduced
+    by the run are left alone, so unchanged rows cost no writes or WAL.
+    """
+    cursor = None
+    stg_table_name_str = _get_stg_table_name_str(script_id)
+    columns = "rule_id, source_id, source_uid, data_value, txn_date"
+
+    try:
+        cursor = db.cursor()
+
+        # Current rows of the staged keys, read once (temp tables are not WAL-logged)
+        cursor.execute(f"""
+            CREATE TEMP TABLE dq_publish_slice ON COMMIT DROP AS
+            SELECT {columns} FROM dq.bad_detail
+            WHERE (rule_id, source_id) IN (SELECT DISTINCT rule_id, source_id FROM stg.{stg_table_name_str});
+        """)
+        slice_rows = cursor.rowcount
+
+        # EXCEPT compares NULLs as equal, like IS NOT DISTINCT FROM
+        cursor.execute(f"""
+            CREATE TEMP TABLE dq_publish_new ON COMMIT DROP AS
+            SELECT {columns} FROM stg.{stg_table_name_str}
+            EXCEPT
+            SELECT {columns} FROM dq_publish_slice;
+        """)
+        new_rows = cursor.rowcount
+        cursor.execute(f"""
+            CREATE TEMP TABLE dq_publish_resolved ON COMMIT DROP AS
+            SELECT {columns} FROM dq_publish_slice
+            EXCEPT
+            SELECT {columns} FROM stg.{stg_table_name_str};
+        """)
+        resolved_rows = cursor.rowcount
+
+        # Resolved first: a row whose data_value or txn_date changed is in both sets
+        if resolved_rows:
+            cursor.execute("""
+                DELETE FROM DQ.bad_detail b
+                USING dq_publish_resolved r
+                WHERE b.rule_id = r.rule_id
+                  AND b.source_id = r.source_id
+                  AND b.source_uid IS NOT DISTINCT FROM r.source_uid
+                  AND b.data_value IS NOT DISTINCT FROM r.data_value
+                  AND b.txn_date IS NOT DISTINCT FROM r.txn_date;
+            """)
+        if new_rows:
+            cursor.execute(f"INSERT INTO DQ.bad_detail ({columns}) SELECT {columns} FROM dq_publish_new;")
+
+        if settings["incremental"]:
+            _save_watermarks(cursor, script_id, settings["watermark_value"], settings["watermark_value"])
+        db.commit()
+        if new_rows or resolved_rows:
+            bump_data_version(db, "dq.bad_detail")
+
+        return {"success": True, "mode": "delta", "published_rows": new_rows, "new_rows": new_rows,
+                "resolved_rows": resolved_rows, "unchanged_rows": slice_rows - resolved_rows}
+
+    except Exception:
+        if db:
+            db.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+
+
+def _publish_chunked(db, script_id: int, settings: Dict[str, Any], batch_size: int,
+                     atomic: bool = False) -> Dict[str, Any]:
+    """
+    Replace the staged keys in batches of batch_size keys, joining bad_detail against a
+    numbered key table instead of passing the keys from Python.
+
+    Each batch deletes and re-inserts the same keys in one transaction, so readers never
+    see a half-published key, and row locks are held for one batch at a time. With
+    atomic=True all batches share a single transaction (all keys flip together).
+    Reports throughput and the time spent acquiring row locks.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1.")
+    cursor = None
+    stg_table_name_str = _get_stg_table_name_str(script_id)
+    started = time.monotonic()
+    published_rows = deleted_rows = batches_done = 0
+    lock_wait_ms = max_batch_lock_ms = 0.0
+
+    try:
+        cursor = db.cursor()
+        # Kept across the per-batch commits; dropped in finally
+        cursor.execute("DROP TABLE IF EXISTS dq_publish_keys;")
+        cursor.execute(f"""
+            CREATE TEMP TABLE dq_publish_keys AS
+            SELECT rule_id, source_id, (row_number() OVER (ORDER BY rule_id, source_id) - 1) / %s AS batch
+            FROM (SELECT DISTINCT rule_id, source_id FROM stg.{stg_table_name_str}) k;
+        """, (batch_size,))
+        key_count = cursor.rowcount
+        if not key_count:
+            db.commit()
+            return {"success": True, "message": "Staging table is empty. Nothing to publish.", "published_rows": 0}
+        cursor.execute("CREATE INDEX ON dq_publish_keys (batch);")
+        cursor.execute("ANALYZE dq_publish_keys;")
+        db.commit()
+
+        batch_count = (key_count + batch_size - 1) // batch_size
+        for batch in range(batch_count):
+            cursor.execute(f"SET LOCAL lock_timeout = {int(PUBLISH_LOCK_TIMEOUT_MS)};")
+
+            # Take the batch's row locks first so waiting on concurrent writers is measured on its own
+            lock_started = time.monotonic()
+            cursor.execute("""
+                SELECT count(*) FROM (
+                    SELECT 1 FROM DQ.bad_detail b
+                    JOIN dq_publish_keys k ON b.rule_id = k.rule_id AND b.source_id = k.source_id
+                    WHERE k.batch = %s
+                    FOR UPDATE OF b
+                ) locked;
+            """, (batch,))
+            batch_lock_ms = (time.monotonic() - lock_started) * 1000
+            lock_wait_ms += batch_lock_ms
+            max_batch_lock_ms = max(max_batch_lock_ms, batch_lock_ms)
+
+            cursor.execute("""
+                DELETE FROM DQ.bad_detail b
+                USING dq_publish_keys k
+                WHERE k.batch = %s AND b.rule_id = k.rule_id AND b.source_id = k.source_id;
+            """, (batch,))
+            deleted_rows += cursor.rowcount
+            cursor.execute(f"""
+                INSERT INTO DQ.bad_detail (rule_id, source_id, source_uid, data_value, txn_date)
+                SELECT s.rule_id, s.source_id, s.source_uid, s.data_value, s.txn_date
+                FROM stg.{stg_table_name_str} s
+                JOIN dq_publish_keys k ON s.rule_id = k.rule_id AND s.source_id = k.source_id
+                WHERE k.batch = %s;
+            """, (batch,))
+            published_rows += cursor.rowcount
+
+            if batch == batch_count - 1 and settings["incremental"]:
+                _save_watermarks(cursor, script_id, settings["watermark_value"], settings["watermark_value"])
+            if not atomic:
+                db.commit()
+            batches_done += 1
+        if atomic:
+            db.commit()
+        bump_data_version(db, "dq.bad_detail")
+
+        elapsed = time.monotonic() - started
+        return {
+            "success": True,
+            "mode": "chunked",
+            "published_rows": published_rows,
+            "deleted_rows": deleted_rows,
+            "keys_replaced_count": key_count,
+            "batches": batch_count,
+            "batch_size": batch_size,
+            "duration_seconds": round(elapsed, 3),
+            "rows_per_second": round(published_rows / elapsed) if elapsed > 0 else None,
+            "lock_wait_ms": round(lock_wait_ms, 1),
+            "max_batch_lock_wait_ms": round(max_batch_lock_ms, 1),
+        }
+
+    except Exception as e:
+        if db:
+            db.rollback()
+        if batches_done and not atomic:
+            bump_data_version(db, "dq.bad_detail")  # earlier batches are already committed
+            if isinstance(e, psycopg2.errors.LockNotAvailable):
+                raise ValueError(f"Publish stopped after {batches_done} committed batches: could not lock rows "
+                                 f"within {PUBLISH_LOCK_TIMEOUT_MS} ms. Publishing again replaces all keys.") from e
+        elif isinstance(e, psycopg2.errors.LockNotAvailable):
+            raise ValueError(f"Publish could not lock dq.bad_detail rows within {PUBLISH_LOCK_TIMEOUT_MS} ms; try again.") from e
+        raise
+    finally:
+        if cursor:
+            try:
+                cursor.execute("DROP TABLE IF EXISTS dq_publish_keys;")
+                db.commit()
+            except psycopg2.Error:
+                db.rollback()
+            cursor.close()
+
+
+# ========================================================================================
+# PARTITIONED BAD_DETAIL (see bad_detail_partition_migration.sql)
+# ========================================================================================
+
+BAD_DETAIL_DEFAULT_PARTITION = "bad_detail_default"
+
+
+def _partition_name(rule_id: Any) -> str:
+    """Partition of dq.bad_detail holding one rule_id (same naming as the migration: md5(rule_id::text))."""
+    return f"bad_detail_r_{hashlib.md5(str(rule_id).encode('utf-8')).hexdigest()[:16]}"
+
+
+def _bad_detail_is_partitioned(db) -> bool:
+    with db.cursor() as cursor:
+        cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('dq.bad_detail');")
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def _publish_partition_swap(db, script_id: int, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Full publish on a partitioned dq.bad_detail.
+
+    For every rule_id in staging, a replacement table is built outside the partition tree
+    from the staging rows. Replacement and old tables are named per publish
+    (<partition>__new_<script_id>_<token>, __old_...), so concurrent publishes sharing a
+    rule (or of the same script) never touch each other's tables.
+
+    The swap transaction (under PUBLISH_LOCK_TIMEOUT_MS) takes an advisory lock per rule,
+    so swaps of the same rule run one after the other; locks each rule's current partition
+    (or the default partition on a rule's first publish) in EXCLUSIVE mode, which blocks
+    writers but not readers; copies the rule's existing rows for source_ids the script did
+    not produce into the replacement; and swaps the replacements in (DETACH old, ATTACH
+    new). Copying under the lock means no write made since the build is lost, but it also
+    means the lock is held while those rows are copied: the swap takes time proportional to
+    the rows the script's rules have for other source_ids (none when a rule is published by
+    one script only). The first DETACH takes an ACCESS EXCLUSIVE lock on dq.bad_detail,
+    blocking its readers until commit, and while a default partition exists each ATTACH
+    scans it to check none of its rows belong to the new partition. Nothing is deleted
+    from live partitions, so no dead tuples are left; the old partitions are dropped after
+    the commit.
+    """
+    cursor = None
+    stg_table_name_str = _get_stg_table_name_str(script_id)
+    token = f"{script_id}_{uuid.uuid4().hex[:8]}"
+    new_suffix = f"__new_{token}"
+    old_suffix = f"__old_{token}"
+    built = []  # (rule_id, partition name)
+
+    try:
+        cursor = db.cursor()
+        cursor.execute(f"SELECT DISTINCT rule_id, source_id FROM stg.{stg_table_name_str};")
+        keys_to_replace = cursor.fetchall()
+        if not keys_to_replace:
+            return {"success": True, "message": "Staging table is empty. Nothing to publish.", "published_rows": 0}
+        rule_ids = sorted({rule_id for rule_id, _ in keys_to_replace}, key=str)
+        if None in rule_ids:
+            raise ValueError("Staging table contains rows without rule_id; they cannot be published to a partition.")
+
+        # Build phase: replacement tables are invisible to readers until the swap
+        published_rows = 0
+        for rule_id in rule_ids:
+            partition = _partition_name(rule_id)
+            cursor.execute(f"CREATE TABLE dq.{partition}{new_suffix} (LIKE dq.bad_detail INCLUDING ALL);")
+            built.append((rule_id, partition))
+            # Lets ATTACH skip its validation scan
+            cursor.execute(
+                f"ALTER TABLE dq.{partition}{new_suffix} ADD CONSTRAINT {partition}__rule_check "
+                f"CHECK (rule_id IS NOT NULL AND rule_id = %s);", (rule_id,)
+            )
+            cursor.execute(f"""
+                INSERT INTO dq.{partition}{new_suffix} (rule_id, source_id, source_uid, data_value, txn_date)
+                SELECT rule_id, source_id, source_uid, data_value, txn_date
+                FROM stg.{stg_table_name_str} WHERE rule_id = %s;
+            """, (rule_id,))
+            published_rows += cursor.rowcount
+        db.commit()
+
+        # Swap phase: one short transaction for all rules of the script
+        started = time.monotonic()
+        cursor.execute(f"SET LOCAL lock_timeout = {int(PUBLISH_LOCK_TIMEOUT_MS)};")
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (f"dq.{BAD_DETAIL_DEFAULT_PARTITION}",))
+        has_default = cursor.fetchone()[0]
+        # Publishes of other scripts with the same rules swap after this one commits
+        # (rule_ids are sorted, so two scripts always take the locks in the same order)
+        for rule_id, _ in built:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (f"dq.bad_detail:{rule_id}",))
+        existing = set()
+        for rule_id, partition in built:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", (f"dq.{partition}",))
+            if cursor.fetchone()[0]:
+                existing.add(partition)
+                source = partition
+            elif has_default:
+                source = BAD_DETAIL_DEFAULT_PARTITION
+            else:
+                continue
+            # EXCLUSIVE blocks writers until commit but not readers; then keep the rule's
+            # rows for source_ids this script does not publish
+            cursor.execute(f"LOCK TABLE dq.{source} IN EXCLUSIVE MODE;")
+            cursor.execute(f"""
+                INSERT INTO dq.{partition}{new_suffix}
+                SELECT b.* FROM dq.{source} b
+                WHERE b.rule_id = %s
+                  AND NOT EXISTS (
+                      SELECT 1 FROM stg.{stg_table_name_str} s
+                      WHERE s.rule_id = b.rule_id AND s.source_id = b.source_id
+                  );
+            """, (rule_id,))
+        replaced = []
+        for rule_id, partition in built:
+            if partition in existing:
+                cursor.execute(f"ALTER TABLE dq.bad_detail DETACH PARTITION dq.{partition};")
+                cursor.execute(f"ALTER TABLE dq.{partition} RENAME TO {partition}{old_suffix};")
+                replaced.append(partition)
+            elif has_default:
+                # First publish of this rule: its rows were copied from the default partition above
+                cursor.execute(f"DELETE FROM dq.{BAD_DETAIL_DEFAULT_PARTITION} WHERE rule_id = %s;", (rule_id,))
+            cursor.execute(f"ALTER TABLE dq.{partition}{new_suffix} RENAME TO {partition};")
+            cursor.execute(f"ALTER TABLE dq.bad_detail ATTACH PARTITION dq.{partition} FOR VALUES IN (%s);", (rule_id,))
+        if settings["incremental"]:
+            _save_watermarks(cursor, script_id, settings["watermark_value"], settings["watermark_value"])
+        db.commit()
+        swap_ms = round((time.monotonic() - started) * 1000, 1)
+        built = []
+        bump_data_version(db, "dq.bad_detail")
+
+        # Old partitions are detached: dropping them only locks the tables themselves
+        for partition in replaced:
+            cursor.execute(f"DROP TABLE IF EXISTS dq.{partition}{old_suffix};")
+        for rule_id in rule_ids:
+            cursor.execute(f"ANALYZE dq.{_partition_name(rule_id)};")
+        db.commit()
+
+        return {"success": True, "published_rows": published_rows, "keys_replaced_count": len(keys_to_replace),
+                "mode": "full", "partitions_swapped": len(rule_ids), "swap_ms": swap_ms}
+
+    except psycopg2.errors.LockNotAvailable as e:
+        db.rollback()
+        raise ValueError(f"Publish could not lock dq.bad_detail within {PUBLISH_LOCK_TIMEOUT_MS} ms; try again.") from e
+    except Exception:
+        if db:
+            db.rollback()
+        raise
+    finally:
+        # Replacement tables left over from a failed build or swap
+        if cursor and built:
+            try:
+                for _, partition in built:
+                    cursor.execute(f"DROP TABLE IF EXISTS dq.{partition}{new_suffix};")
+                db.commit()
+            except psycopg2.Error as cleanup_err:
+                db.rollback()
+                print(f"Error dropping replacement partitions for script {script_id}: {str(cleanup_err)}")
+        if cursor:
+            cursor.close()
+
+
 # ========================================================================================
 # SCHEDULE MANAGEMENT
 # ========================================================================================
@@ -686,6 +1605,39 @@ def log_user_action(db, user_id: int, username: str, action: str,
         db.rollback()
         return {"success": False, "error": str(e)}
 
+def log_user_actions_batch(db, actions: List[Dict[str, Any]]) -> int:
+    """
+    Insert many user actions with a single multi-row INSERT.
+
+    Args:
+        db: Database connection
+        actions: Dicts with the log_user_action arguments plus 'created_at'
+
+    Returns:
+        Number of rows inserted (the caller commits)
+    """
+    if not actions:
+        return 0
+    from psycopg2.extras import execute_values
+
+    cursor = db.cursor()
+    try:
+        rows = [
+            (
+                a["user_id"], a["username"], a["action"], a.get("resource_type"), a.get("resource_id"),
+                json.dumps(a["details"]) if a.get("details") else None, a.get("user_agent"), a["created_at"]
+            )
+            for a in actions
+        ]
+        execute_values(cursor, """
+            INSERT INTO dq.user_actions_log
+            (user_id, username, action, resource_type, resource_id, details, user_agent, created_at)
+            VALUES %s
+        """, rows, page_size=len(rows))
+        return len(rows)
+    finally:
+        cursor.close()
+
 def get_user_actions_log(db, limit: int = 100, offset: int = 0, 
                         user_id: Optional[int] = None, action: Optional[str] = None,
                         filters: Optional[dict] = None,
@@ -856,7 +1808,7 @@ def get_schedule_run_logs(db, limit: int = 100, offset: int = 0,
 # QUERY EXECUTION
 # ========================================================================================
 
-def execute_query(query: str, db, params: Optional[List[Any]] = None) -> Dict[str, Any]:
+def execute_query(query: str, db, params: Optional[List[Any]] = None, columnar: bool = False) -> Dict[str, Any]:
     """
     Execute a SQL query and return results in a standardized format.
     
@@ -864,10 +1816,12 @@ def execute_query(query: str, db, params: Optional[List[Any]] = None) -> Dict[st
         query: SQL query string to execute
         db: Database connection
         params: Optional list of parameters for the query
+        columnar: Return {"columns": [...], "rows": [[...]]} instead of row dictionaries
         
     Returns:
         Dictionary with 'data' key containing list of row dictionaries,
         and 'column_names' key containing list of column names
+        (or 'columns' and 'rows' when columnar is True)
     """
     cursor = None
     try:
@@ -878,20 +1832,18 @@ def execute_query(query: str, db, params: Optional[List[Any]] = None) -> Dict[st
         else:
             cursor.execute(query)
         
-        # Get column names from cursor description
-        column_names = [desc[0] for desc in cursor.description] if cursor.description else []
+        # Choose per-column converters once from the cursor description
+        serializer = ResultSerializer(cursor.description)
         
         # Fetch all rows
         rows = cursor.fetchall()
         
-        # Process rows into dictionaries
-        data = []
-        for row in rows:
-            data.append(_process_result_row(row, column_names))
+        if columnar:
+            return serializer.columnar(rows)
         
         return {
-            "data": data,
-            "column_names": column_names
+            "data": serializer.records(rows),
+            "column_names": serializer.column_names
         }
         
     except psycopg2.Error as db_err:
@@ -901,3 +1853,157 @@ def execute_query(query: str, db, params: Optional[List[Any]] = None) -> Dict[st
     finally:
         if cursor:
             cursor.close()
+
+
+def execute_cached_query(query: str, db, params: Optional[List[Any]] = None) -> Dict[str, Any]:
+    """
+    execute_query for read-only call sites, served from result_cache while the
+    tables the query reads are unchanged. On a miss, concurrent identical calls
+    share one execution (single_flight). The returned dict is shared; don't modify it.
+    """
+    _sync_cache_versions(db, query)
+    cached = result_cache.get(query, params)
+    if cached is not None:
+        return cached
+    stamp = result_cache.stamp(query)
+
+    def run():
+        result = execute_query(query, db, params)
+        result_cache.set(query, params, result, stamp)
+        return result
+
+    # The stamp is part of the key so callers arriving after a publish don't join an older flight
+    return query_flight.do((cache_key(query, params), stamp), run)
+
+
+# ========================================================================================
+# STREAMING QUERY EXECUTION
+# ========================================================================================
+
+# Rows fetched from the server-side cursor per round trip, and hard caps per stream
+STREAM_FETCH_SIZE = int(os.getenv("STREAM_FETCH_SIZE", "5000"))
+STREAM_MAX_ROWS = int(os.getenv("STREAM_MAX_ROWS", "1000000"))
+STREAM_MAX_BYTES = int(os.getenv("STREAM_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Supported stream formats and their media types
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def stream_query(query: str, db, fmt: str = "ndjson", max_rows: Optional[int] = None,
+                 max_bytes: Optional[int] = None, fetch_size: int = STREAM_FETCH_SIZE):
+    """
+    Execute a query on a server-side (named) cursor and stream the result.
+
+    The query runs and the first batch is fetched before this returns, so SQL
+    errors are raised here rather than halfway through a response. Memory use
+    stays at one batch regardless of result size.
+
+    Args:
+        query: SQL query string (a SELECT or VALUES statement)
+        db: Database connection (must not be in autocommit mode)
+        fmt: 'ndjson' (one JSON object per row) or 'csv' (with a header row)
+        max_rows: Row cap, at most STREAM_MAX_ROWS
+        max_bytes: Byte cap, at most STREAM_MAX_BYTES
+        fetch_size: Rows fetched per round trip
+
+    Returns:
+        Tuple of (column_names, iterator of encoded chunks). When a cap is hit the
+        last chunk is a truncation marker: {"_truncated": true, ...} for NDJSON or
+        a '# TRUNCATED: ...' line for CSV.
+    """
+    import uuid
+
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"Unsupported stream format '{fmt}'. Use one of: {', '.join(STREAM_FORMATS)}")
+    max_rows = min(max_rows, STREAM_MAX_ROWS) if max_rows else STREAM_MAX_ROWS
+    max_bytes = min(max_bytes, STREAM_MAX_BYTES) if max_bytes else STREAM_MAX_BYTES
+
+    cursor = db.cursor(name=f"dqx_stream_{uuid.uuid4().hex}")
+    try:
+        cursor.execute(query)
+        first_batch = cursor.fetchmany(fetch_size)
+    except psycopg2.Error as db_err:
+        _close_stream(db, cursor)
+        raise ValueError(f"Database query failed: {str(db_err)}") from db_err
+
+    serializer = ResultSerializer(cursor.description)
+    chunks = _stream_chunks(db, cursor, serializer, first_batch, fmt, max_rows, max_bytes, fetch_size)
+    return serializer.column_names, chunks
+
+
+def _stream_chunks(db, cursor, serializer: ResultSerializer, batch: list, fmt: str,
+                   max_rows: int, max_bytes: int, fetch_size: int):
+    """Encode batches from a named cursor until it is exhausted or a cap is hit."""
+    import csv
+    import io
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    column_names = serializer.column_names
+    convert_row = serializer.convert_row
+
+    def encode_line(values) -> bytes:
+        if fmt == "ndjson":
+            return (json.dumps(dict(zip(column_names, values))) + "\n").encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(["" if v is None else v for v in values])
+        return buffer.getvalue().encode("utf-8")
+
+    rows_sent = 0
+    bytes_sent = 0
+    truncated = None
+    try:
+        if fmt == "csv":
+            header = encode_line(column_names)
+            bytes_sent += len(header)
+            yield header
+
+        while batch:
+            lines = []
+            for row in batch:
+                if rows_sent >= max_rows:
+                    truncated = "max_rows"
+                    break
+                line = encode_line(convert_row(row))
+                if bytes_sent + len(line) > max_bytes:
+                    truncated = "max_bytes"
+                    break
+                lines.append(line)
+                rows_sent += 1
+                bytes_sent += len(line)
+            if lines:
+                yield b"".join(lines)
+            if truncated:
+                break
+            batch = cursor.fetchmany(fetch_size)
+
+        if truncated:
+            limit = max_rows if truncated == "max_rows" else max_bytes
+            if fmt == "ndjson":
+                marker = json.dumps({"_truncated": True, "reason": truncated, "limit": limit, "rows": rows_sent}) + "\n"
+            else:
+                marker = f"# TRUNCATED: {truncated} limit of {limit} reached after {rows_sent} rows\n"
+            yield marker.encode("utf-8")
+    except psycopg2.Error as db_err:
+        # Headers are already sent, so report the failure in-band
+        message = f"Database query failed after {rows_sent} rows: {str(db_err)}"
+        if fmt == "ndjson":
+            yield (json.dumps({"_error": message}) + "\n").encode("utf-8")
+        else:
+            yield f"# ERROR: {message}\n".encode("utf-8")
+    finally:
+        _close_stream(db, cursor)
+
+
+def _close_stream(db, cursor):
+    """Close a streaming cursor and end its read transaction."""
+    try:
+        db.rollback()
+    except Exception:
+        pass
+    try:
+        cursor.close()
+    except Exception:
+        pass
@@ -1,6 +1,10 @@
 from dotenv import load_dotenv
 import os
 import psycopg2
+from contextlib import contextmanager
+
+from app.db_pool import ConnectionPool, pool_settings_from_env
+from app.request_db import current_request_connection
 
 # Determine the project root directory
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
@@ -36,12 +40,21 @@ if not all([DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD]):
         print("Error: Database configuration is incomplete. Please set either individual DB_* variables or DATABASE_URL")
         raise ValueError("Database configuration is incomplete")
 
+# Connection pool for the application database (configured through DB_POOL_* variables)
+db_pool = ConnectionPool(DATABASE_URL, name="default", **pool_settings_from_env("DB_"))
+
 # Dependency to get DB connection
 def get_db():
+    # Within an HTTP request, share the request's connection (released by RequestDBMiddleware)
+    request_conn = current_request_connection()
+    if request_conn is not None and DB_TYPE.lower() == "postgresql":
+        yield request_conn.acquire()
+        return
+
     conn = None  # Initialize conn to None
     try:
         if DB_TYPE.lower() == "postgresql":
-            conn = psycopg2.connect(DATABASE_URL)
+            conn = db_pool.getconn()
         elif DB_TYPE.lower() == "oracle":
             # For future Oracle support
             # import cx_Oracle or oracledb
@@ -52,4 +65,21 @@ def get_db():
         yield conn
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            db_pool.putconn(conn)
+
+@contextmanager
+def db_connection():
+    """Context manager form of get_db() for code that is not a route dependency."""
+    db_gen = get_db()
+    try:
+        yield next(db_gen)
+    finally:
+        db_gen.close()
+
+def get_pool_stats():
+    """Return usage statistics for the application connection pool."""
+    return db_pool.stats()
+
+def close_db_pool():
+    """Close the application connection pool (called on shutdown)."""
+    db_pool.close()
@@ -0,0 +1,401 @@
+"""
+Connection pooling for the DQX application.
+
+Provides a thread-safe psycopg2 connection pool with min/max sizes, idle
+timeout, maximum connection lifetime, checkout timeout and validation on
+checkout. Pool settings are read from environment variables using the same
+prefix convention as the connection settings themselves, for example
+``DB_POOL_MAX_SIZE`` for the application database.
+"""
+
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+
+# Default pool settings (overridable through <PREFIX>POOL_* environment variables)
+DEFAULT_POOL_SETTINGS = {
+    "min_size": 1,
+    "max_size": 10,
+    "idle_timeout": 300.0,       # seconds an idle connection may stay open
+    "max_lifetime": 3600.0,      # seconds before a connection is recycled
+    "checkout_timeout": 30.0,    # seconds to wait for a free connection
+    "validate_on_checkout": True,
+    "validation_interval": 30.0, # only ping connections idle for longer than this
+    "connect_timeout": 10,       # seconds to wait for a new connection (0 = OS default)
+}
+
+# How often the background reaper evicts idle/expired connections (seconds)
+REAPER_INTERVAL = float(os.getenv("DB_POOL_REAPER_INTERVAL", "30"))
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class PoolClosed(Exception):
+    """Raised when a connection is requested from a closed pool."""
+
+
+def _env_bool(value: str) -> bool:
+    """Interpret an environment variable value as a boolean."""
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def pool_settings_from_env(prefix: str, defaults: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Read pool settings for a connection from environment variables.
+
+    Args:
+        prefix: Environment variable prefix, e.g. "DB_" or "DB_SOURCE_PROD_"
+        defaults: Optional overrides for DEFAULT_POOL_SETTINGS
+
+    Returns:
+        Dictionary of keyword arguments for ConnectionPool
+    """
+    settings = dict(DEFAULT_POOL_SETTINGS)
+    if defaults:
+        settings.update(defaults)
+
+    for key, default in list(settings.items()):
+        raw = os.getenv(f"{prefix}POOL_{key.upper()}")
+        if raw is None or raw == "":
+            continue
+        try:
+            if isinstance(default, bool):
+                settings[key] = _env_bool(raw)
+            elif isinstance(default, int):
+                settings[key] = int(raw)
+            else:
+                settings[key] = float(raw)
+        except ValueError:
+            print(f"Warning: invalid value '{raw}' for {prefix}POOL_{key.upper()}, using {default}")
+
+    return settings
+
+
+class _PooledConnection:
+    """Bookkeeping for a single pooled connection."""
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn, created_at: float):
+        self.conn = conn
+        self.created_at = created_at
+        self.last_used = created_at
+
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool.
+
+    Connections are created lazily up to ``max_size``. Idle connections are
+    reused most-recently-used first, validated on checkout, and closed once
+    they exceed ``idle_timeout`` (while keeping ``min_size`` open) or
+    ``max_lifetime``. When the pool is exhausted callers wait up to
+    ``checkout_timeout`` seconds before PoolTimeout is raised.
+    """
+
+    def __init__(self, dsn: str, name: str = "default", min_size: int = 1, max_size: int = 10,
+                 idle_timeout: float = 300.0, max_lifetime: float = 3600.0,
+                 checkout_timeout: float = 30.0, validate_on_checkout: bool = True,
+                 validation_interval: float = 30.0, connect_timeout: int = 10,
+                 connect: Optional[Callable[[], Any]] = None):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if min_size < 0 or min_size > max_size:
+            raise ValueError("min_size must be between 0 and max_size")
+
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.validate_on_checkout = validate_on_checkout
+        self.validation_interval = validation_interval
+        self.connect_timeout = connect_timeout
+        connect_kwargs = {"connect_timeout": connect_timeout} if connect_timeout > 0 else {}
+        self._connect = connect or (lambda: psycopg2.connect(dsn, **connect_kwargs))
+
+        self._cond = threading.Condition()
+        self._idle: deque = deque()
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._size = 0  # open connections plus slots reserved for connections being created
+        self._waiters = 0
+        self._closed = False
+
+        # Counters for sizing the pool
+        self._counters = {
+            "checkouts": 0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkout_timeouts": 0,
+            "validation_failures": 0,
+            "total_wait_seconds": 0.0,
+        }
+
+        _register_pool(self)
+
+    # ------------------------------------------------------------------
+    # Checkout / return
+    # ------------------------------------------------------------------
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Check out a connection, waiting up to the checkout timeout."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            entry = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolClosed(f"Connection pool '{self.name}' is closed")
+
+                    entry = self._pop_usable_idle()
+                    if entry is not None:
+                        break
+
+                    if self._size < self.max_size:
+                        self._size += 1  # reserve a slot, connect outside the lock
+                        create = True
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["checkout_timeouts"] += 1
+                        raise PoolTimeout(
+                            f"Timed out after {timeout:.1f}s waiting for a connection "
+                            f"from pool '{self.name}' (max_size={self.max_size})"
+                        )
+                    self._waiters += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+
+            if create:
+                entry = self._create_entry()
+            elif not self._validate(entry):
+                self._discard(entry)
+                continue
+
+            with self._cond:
+                self._in_use[id(entry.conn)] = entry
+                self._counters["checkouts"] += 1
+                self._counters["total_wait_seconds"] += time.monotonic() - started
+            return entry.conn
+
+    def putconn(self, conn, close: bool = False):
+        """Return a connection to the pool, closing it if it is broken or expired."""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+
+        if entry is None:
+            # Not one of ours (or already returned) - just make sure it is closed
+            self._close_quietly(conn)
+            return
+
+        now = time.monotonic()
+        if close or self._closed or conn.closed or self._is_expired(entry, now) or not self._reset(conn):
+            self._discard(entry)
+            return
+
+        with self._cond:
+            entry.last_used = time.monotonic()
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Context manager that checks out a connection and returns it afterwards."""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def owns(self, conn) -> bool:
+        """Check whether a connection is currently checked out from this pool."""
+        with self._cond:
+            return id(conn) in self._in_use
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def evict_idle(self) -> int:
+        """Close idle connections past the idle timeout or max lifetime. Returns the number closed."""
+        now = time.monotonic()
+        to_close = []
+        with self._cond:
+            kept = deque()
+            # Oldest idle connections sit at the left of the deque
+            while self._idle:
+                entry = self._idle.popleft()
+                idle_for = now - entry.last_used
+                keep_for_min = (self._size - len(to_close)) <= self.min_size
+                if self._is_expired(entry, now) or (
+                    self.idle_timeout > 0 and idle_for > self.idle_timeout and not keep_for_min
+                ):
+                    to_close.append(entry)
+                else:
+                    kept.append(entry)
+            self._idle = kept
+
+        for entry in to_close:
+            self._discard(entry)
+        return len(to_close)
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for entry in idle:
+            self._discard(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of pool usage for monitoring and sizing."""
+        with self._cond:
+            checkouts = self._counters["checkouts"]
+            return {
+                "name": self.name,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "closed": self._closed,
+                "checkouts": checkouts,
+                "connections_created": self._counters["connections_created"],
+                "connections_closed": self._counters["connections_closed"],
+                "checkout_timeouts": self._counters["checkout_timeouts"],
+                "validation_failures": self._counters["validation_failures"],
+                "avg_wait_ms": round(self._counters["total_wait_seconds"] * 1000 / checkouts, 3) if checkouts else 0.0,
+            }
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    def _pop_usable_idle(self) -> Optional[_PooledConnection]:
+        """Pop the most recently used idle connection, dropping expired ones. Caller holds the lock."""
+        now = time.monotonic()
+        while self._idle:
+            entry = self._idle.pop()
+            if entry.conn.closed or self._is_expired(entry, now):
+                self._size -= 1
+                self._counters["connections_closed"] += 1
+                self._close_quietly(entry.conn)
+                continue
+            return entry
+        return None
+
+    def _create_entry(self) -> _PooledConnection:
+        """Open a new connection for a reserved slot."""
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._counters["connections_created"] += 1
+        return _PooledConnection(conn, time.monotonic())
+
+    def _validate(self, entry: _PooledConnection) -> bool:
+        """Check that an idle connection is still usable before handing it out."""
+        conn = entry.conn
+        if conn.closed:
+            return False
+        if not self.validate_on_checkout:
+            return True
+        if time.monotonic() - entry.last_used < self.validation_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            conn.rollback()
+            return True
+        except Exception as e:
+            print(f"Discarding invalid connection from pool '{self.name}': {e}")
+            with self._cond:
+                self._counters["validation_failures"] += 1
+            return False
+
+    def _reset(self, conn) -> bool:
+        """Bring a returned connection back to a clean state. Returns False if it must be discarded."""
+        try:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+            return True
+        except Exception:
+            return False
+
+    def _is_expired(self, entry: _PooledConnection, now: float) -> bool:
+        return self.max_lifetime > 0 and now - entry.created_at > self.max_lifetime
+
+    def _discard(self, entry: _PooledConnection):
+        """Close a connection and release its slot."""
+        self._close_quietly(entry.conn)
+        with self._cond:
+            self._size -= 1
+            self._counters["connections_closed"] += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+
+
+# ----------------------------------------------------------------------
+# Background reaper shared by all pools
+# ----------------------------------------------------------------------
+
+_pools: "weakref.WeakSet[ConnectionPool]" = weakref.WeakSet()
+_reaper_lock = threading.Lock()
+_reaper_thread: Optional[threading.Thread] = None
+
+
+def _register_pool(pool: ConnectionPool):
+    """Register a pool with the idle reaper, starting the reaper on first use."""
+    global _reaper_thread
+    with _reaper_lock:
+        _pools.add(pool)
+        if _reaper_thread is None and REAPER_INTERVAL > 0:
+            _reaper_thread = threading.Thread(target=_reap_forever, name="db-pool-reaper", daemon=True)
+            _reaper_thread.start()
+
+
+def _reap_forever():
+    while True:
+        time.sleep(REAPER_INTERVAL)
+        for pool in list(_pools):
+            try:
+                pool.evict_idle()
+            except Exception as e:
+                print(f"Error evicting idle connections from pool '{pool.name}': {e}")
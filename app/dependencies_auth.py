@@ -4,47 +4,64 @@ Authentication dependencies for use in routes
 from typing import Optional
 from fastapi import Cookie, Depends, HTTPException, Request, status
 from fastapi.responses import RedirectResponse
-from jose import JWTError, jwt
 
 from app import auth
 from app import crud
-from app.database import get_db
+from app.database import db_connection
+from app.user_cache import user_cache
 
 # Constants - should match those in auth.py
 SECRET_KEY = auth.SECRET_KEY
 ALGORITHM = auth.ALGORITHM
 
-def get_current_user_from_cookie(
-    request: Request,
-    access_token: Optional[str] = Cookie(None),
-    db = Depends(get_db)
-):
+def get_token_subject(access_token: Optional[str]) -> Optional[str]:
     """
-    Get the current user from the cookie.
-    If no user is found, return None.
+    Decode an access token cookie value and return its subject (username).
+    Returns None if the token is missing, invalid or revoked.
     """
     if not access_token:
         return None
         
     # Extract the token from the "Bearer <token>" format
-    if access_token.startswith("Bearer "):
-        token = access_token[7:]
-    else:
-        token = access_token
+    token = access_token[7:] if access_token.startswith("Bearer ") else access_token
         
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-    except JWTError:
-        return None
+    payload = auth.decode_access_token(token)
+    return (payload.get("sub") or None) if payload else None
+
+def get_user_for_subject(username: str):
+    """
+    Resolve a token subject to a User, using the shared user cache.
+    The database is only queried on a cache miss.
+    """
+    user = user_cache.get(username)
+    if user is not None:
+        return user
         
-    user = crud.get_user_by_username(db, username)
-    if user is None:
+    # Taken before the query so an invalidation during it keeps the result out of the cache
+    generation = user_cache.generation()
+    with db_connection() as db:
+        user = crud.get_user_by_username(db, username)
+    user_cache.set(user, generation)
+    return user
+
+def get_current_user_from_cookie(
+    request: Request,
+    access_token: Optional[str] = Cookie(None)
+):
+    """
+    Get the current user from the cookie.
+    If no user is found, return None.
+    """
+    username = get_token_subject(access_token)
+    if username is None:
         return None
         
-    return user
+    # UserMiddleware has usually resolved the same token already
+    user = getattr(request.state, "user", None)
+    if user is not None and user.username == username:
+        return user
+        
+    return get_user_for_subject(username)
 
 def login_required(request: Request, user=Depends(get_current_user_from_cookie)):
     """
@@ -2,15 +2,20 @@ from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware.sessions import SessionMiddleware
+import asyncio
 import os
-from app import crud
-from app.database import get_db
+from app import async_crud
+from app.database import close_db_pool, db_pool
+from app.async_database import get_async_db, close_async_db_pool
+from app.multi_db_manager import db_manager
+from app.audit_log_writer import audit_log_writer
+from app.batch_executor import batch_executor
 from .routes import sql_scripts, stats, scheduler, bad_detail, auth, reference_tables, source_data_management, admin, user_actions_log
 from .dependencies import templates, render_template
 from .dependencies_auth import login_required, get_current_user_from_cookie
-from .middleware_logging import UserActionLoggingMiddleware, UserMiddleware
+from .middleware_logging import AuthCheckMiddleware, UserActionLoggingMiddleware, UserMiddleware
+from .request_db import RequestDBMiddleware
 
 # FastAPI app
 app = FastAPI(title="Database Explorer API")
@@ -25,8 +30,21 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": f"An internal server error occurred: {str(exc)}"},
     )
 
-# Add middlewares
-app.add_middleware(UserMiddleware)  # Add this first to have user in all requests
+@app.on_event("shutdown")
+async def shutdown_db_pool():
+    """Close pooled database connections when the application stops."""
+    # Skip queued batch scripts and give running ones BATCH_SHUTDOWN_TIMEOUT seconds,
+    # off the event loop so other shutdown handlers and in-flight requests are not blocked
+    await asyncio.to_thread(batch_executor.shutdown)
+    audit_log_writer.close()  # flush queued audit events while the pool is still open
+    close_db_pool()
+    db_manager.close_all_pools()
+    await close_async_db_pool()
+    await db_manager.close_all_async_pools()
+
+# Add middlewares (each add_middleware call wraps the ones added before it)
+app.add_middleware(AuthCheckMiddleware)  # Auth check for all routes except root ("/"), needs the user
+app.add_middleware(UserMiddleware)  # Sets the user for the auth check and all handlers
 app.add_middleware(UserActionLoggingMiddleware)  # Add logging middleware
 
 # Session middleware (with 1 hour timeout - 3600 seconds)
@@ -81,51 +99,21 @@ async def chrome_devtools_config():
     """
     return {}
 
-# Auth check middleware for all routes except root ("/")
-@app.middleware("http")
-async def auth_middleware(request: Request, call_next):
-    # Skip auth check for root, login, logout, register, token, and static files
-    path = request.url.path
-    if (path == "/" or 
-        path.startswith("/login") or 
-        path.startswith("/logout") or 
-        path.startswith("/register") or 
-        path.startswith("/token") or 
-        path.startswith("/static") or
-        path.startswith("/api/auth/session-check")):
-        return await call_next(request)
-    
-    # For all other routes, verify the user is logged in
-    user = None
-    try:
-        # Check for user in request state (set by UserMiddleware)
-        if hasattr(request.state, "user"):
-            user = request.state.user
-    except Exception:
-        pass
-        
-    # If no user is found, and it's an API call, return 401
-    if user is None and path.startswith("/api/"):
-        return JSONResponse(
-            status_code=401,
-            content={"detail": "Authentication required"}
-        )
-    
-    # Otherwise, continue to the next middleware or handler
-    return await call_next(request)
+# Request-scoped DB connection: added last so it wraps every other middleware
+app.add_middleware(RequestDBMiddleware, pool=db_pool)
 
 # Page Endpoints
 @app.get("/", response_class=HTMLResponse)
 async def read_root(
     request: Request,
-    db = Depends(get_db)
+    db = Depends(get_async_db)
 ):
     """
     Main page - accessible without authentication.
     All other pages require login with a 1-hour session timeout.
     """
-    script_count = crud.get_script_count(db)
-    bad_detail_count = crud.get_bad_detail_count(db)
+    script_count = await async_crud.get_script_count(db)
+    bad_detail_count = await async_crud.get_bad_detail_count(db)
     stats_data = {"script_count": script_count, "bad_detail_count": bad_detail_count}
     return render_template("index.html", {"request": request, "stats": stats_data})
 
@@ -5,26 +5,48 @@ This module contains all middleware classes for the DQX application:
 
 1. UserMiddleware: Extracts user information from JWT tokens and stores it in request state
 2. UserActionLoggingMiddleware: Logs user actions for audit and security purposes
+3. AuthCheckMiddleware: Rejects unauthenticated API calls with 401
 
-The middleware are applied in the following order in main.py:
-1. UserMiddleware (first - to have user available for other middleware)
-2. UserActionLoggingMiddleware (second - to log actions with user context)
+They are plain ASGI middleware (not BaseHTTPMiddleware), so they add no extra
+task per request and pass streaming responses through without buffering.
+
+The middleware are applied in the following order in main.py (outermost first):
+1. UserActionLoggingMiddleware (sees the final status and the user set below)
+2. UserMiddleware (sets request.state.user for everything inside it)
+3. AuthCheckMiddleware (checks the user set by UserMiddleware)
 """
 
 from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from app import crud
-from app.database import get_db
+from fastapi.responses import JSONResponse
+from app.audit_log_writer import audit_log_writer
+from app.dependencies_auth import get_token_subject, get_user_for_subject
 import json
 
 
-class UserMiddleware(BaseHTTPMiddleware):
+class UserMiddleware:
     """Middleware to extract and store user information in request state."""
     
-    async def dispatch(self, request: Request, call_next):
+    # Paths that never use the user, so the lookup is skipped (session checks stay DB-free)
+    SKIP_PREFIXES = ("/api/auth/session-check", "/static")
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        # Request state lives in the scope, so it is shared with the route's Request
+        request = Request(scope)
+        
         # Initialize user as None
         request.state.user = None
         
+        if scope["path"].startswith(self.SKIP_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        
         try:
             # Extract and process user token
             self._process_user_token(request)
@@ -34,62 +56,26 @@ class UserMiddleware(BaseHTTPMiddleware):
             request.state.user = None
                 
         # Always continue to the next handler
-        response = await call_next(request)
-        return response
+        await self.app(scope, receive, send)
     
     def _process_user_token(self, request: Request):
         """Extract and process user authentication token."""
-        # Extract token from cookies
-        access_token = request.cookies.get("access_token")
-        if not access_token:
+        username = get_token_subject(request.cookies.get("access_token"))
+        if not username:
             return
             
-        # Extract the token from the "Bearer <token>" format
-        token = access_token[7:] if access_token.startswith("Bearer ") else access_token
-        
-        # Decode token and get user
-        try:
-            user = self._decode_token_and_get_user(token)
-            request.state.user = user
-        except Exception as e:
-            print(f"Token processing error: {e}")
-            request.state.user = None
-    
-    def _decode_token_and_get_user(self, token: str):
-        """Decode JWT token and fetch user from database."""
-        from jose import JWTError, jwt
-        from app.auth import SECRET_KEY, ALGORITHM
-        from app import crud
-        
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            username = payload.get("sub")
-            if not username:
-                return None
-                
-            return self._get_user_from_database(username)
-        except JWTError:
-            return None
+        request.state.user = self._get_user_from_database(username)
     
     def _get_user_from_database(self, username: str):
-        """Fetch user from database safely."""
-        db_gen = None
+        """Fetch user from the shared user cache or the database safely."""
         try:
-            db_gen = get_db()
-            conn = next(db_gen)
-            return crud.get_user_by_username(conn, username)
+            return get_user_for_subject(username)
         except Exception as db_error:
             print(f"Database error in UserMiddleware: {db_error}")
             return None
-        finally:
-            if db_gen:
-                try:
-                    db_gen.close()
-                except Exception:
-                    pass  # Ignore close errors
 
 
-class UserActionLoggingMiddleware(BaseHTTPMiddleware):
+class UserActionLoggingMiddleware:
     """Middleware to log user actions for audit purposes."""
     
     # Actions that should be logged
@@ -118,17 +104,30 @@ class UserActionLoggingMiddleware(BaseHTTPMiddleware):
         }
     }
     
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = None
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
         # Continue with the request first
-        response = await call_next(request)
+        await self.app(scope, receive, send_wrapper)
         
         # Only log successful actions (2xx status codes)
-        if 200 <= response.status_code < 300:
-            self._log_action_if_needed(request, response)
-        
-        return response
+        if status_code is not None and 200 <= status_code < 300:
+            self._log_action_if_needed(Request(scope), status_code)
     
-    def _log_action_if_needed(self, request: Request, response):
+    def _log_action_if_needed(self, request: Request, status_code: int):
         """Log the action if it matches our criteria."""
         try:
             # Get user from request state (set by UserMiddleware)
@@ -154,7 +153,7 @@ class UserActionLoggingMiddleware(BaseHTTPMiddleware):
             details = {
                 "method": method,
                 "path": path,
-                "status_code": response.status_code
+                "status_code": status_code
             }
             
             # Add form data for POST requests if available
@@ -164,28 +163,16 @@ class UserActionLoggingMiddleware(BaseHTTPMiddleware):
                 except Exception:
                     pass
             
-            # Log the action
-            db_gen = get_db()
-            db = next(db_gen)
-            try:
-                crud.log_user_action(
-                    db=db,
-                    user_id=user.id,
-                    username=user.username,
-                    action=action_info["action"],
-                    resource_type=action_info["resource_type"],
-                    resource_id=resource_id,
-                    details=details,
-                    user_agent=user_agent
-                )
-                # Commit the transaction
-                db.commit()
-            except Exception as e:
-                # Rollback on error
-                db.rollback()
-                print(f"Error logging user action: {e}")
-            finally:
-                db.close()
+            # Queue the action; the audit log writer inserts it in a batch
+            audit_log_writer.log_action(
+                user_id=user.id,
+                username=user.username,
+                action=action_info["action"],
+                resource_type=action_info["resource_type"],
+                resource_id=resource_id,
+                details=details,
+                user_agent=user_agent
+            )
                 
         except Exception as e:
             # Don't let logging errors affect the main request
@@ -235,3 +222,39 @@ class UserActionLoggingMiddleware(BaseHTTPMiddleware):
         # Look for numeric IDs in the path
         match = re.search(r'/(\d+)(?:/|$)', path)
         return int(match.group(1)) if match else None
+
+
+class AuthCheckMiddleware:
+    """Middleware that rejects API calls without a logged-in user."""
+    
+    # Paths that never require authentication
+    PUBLIC_PREFIXES = ("/login", "/logout", "/register", "/token", "/static", "/api/auth/session-check")
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        # Skip auth check for root, login, logout, register, token, and static files
+        path = scope["path"]
+        if path == "/" or path.startswith(self.PUBLIC_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        
+        # For all other routes, verify the user is logged in (set by UserMiddleware)
+        user = scope.get("state", {}).get("user")
+        
+        # If no user is found, and it's an API call, return 401
+        if user is None and path.startswith("/api/"):
+            response = JSONResponse(
+                status_code=401,
+                content={"detail": "Authentication required"}
+            )
+            await response(scope, receive, send)
+            return
+        
+        # Otherwise, continue to the next middleware or handler
+        await self.app(scope, receive, send)
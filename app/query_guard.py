@@ -0,0 +1,503 @@
+"""
+Guard rails for ad-hoc SQL run from the SQL editor and /api/scripts/execute.
+
+Ad-hoc queries must be a single statement (no transaction or session control)
+and run in a read-only transaction with a per-role statement_timeout; session
+settings are reset before the connection goes back to the pool. While a query runs, its backend PID is recorded in an
+active-query registry so admins can list running queries and cancel one with
+pg_cancel_backend. Users can cancel their own queries.
+
+Timeouts are configured per role in milliseconds, for example
+QUERY_TIMEOUT_INPUTTER_MS=30000; QUERY_TIMEOUT_DEFAULT_MS applies to roles
+without their own setting. 0 disables the timeout for that role.
+
+profile_query runs a statement under EXPLAIN (ANALYZE, BUFFERS) in the same
+guarded, rolled-back transaction and returns a flattened per-node timing tree.
+
+Before running, the query can be checked with EXPLAIN (FORMAT JSON) against
+per-role cost thresholds (QUERY_COST_GUARD=off|confirm|reject): planner total
+cost, estimated rows, and sequential scans of large tables such as
+dq.bad_detail. Queries over a threshold are rejected or need confirmation,
+and the plan summary is returned with the result either way. A query whose
+plan cannot be read is treated as over the thresholds.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+from app import crud
+
+# Default statement timeouts per role (milliseconds)
+DEFAULT_ROLE_TIMEOUTS_MS = {
+    "admin": 300000,
+    "creator": 120000,
+    "inputter": 30000,
+}
+QUERY_TIMEOUT_DEFAULT_MS = int(os.getenv("QUERY_TIMEOUT_DEFAULT_MS", "60000"))
+
+
+class QueryCancelledError(ValueError):
+    """Raised when an ad-hoc query is cancelled or hits its statement timeout."""
+
+
+class QueryCostExceededError(ValueError):
+    """Raised when the query plan exceeds the role's cost thresholds."""
+
+    def __init__(self, message: str, plan: Dict[str, Any], requires_confirmation: bool):
+        super().__init__(message)
+        self.plan = plan
+        self.requires_confirmation = requires_confirmation
+
+
+# Cost guard: "off", "confirm" (user may run anyway) or "reject"
+QUERY_COST_GUARD = os.getenv("QUERY_COST_GUARD", "confirm").lower()
+
+# Default cost thresholds per role (None = unlimited):
+# planner total cost, estimated result rows, rows of a guarded table read by a sequential scan
+DEFAULT_ROLE_COST_LIMITS = {
+    "admin": {"max_cost": None, "max_rows": None, "max_seqscan_rows": None},
+    "creator": {"max_cost": 10000000, "max_rows": None, "max_seqscan_rows": 5000000},
+    "inputter": {"max_cost": 1000000, "max_rows": 1000000, "max_seqscan_rows": 1000000},
+}
+
+# Tables whose sequential scans are checked against max_seqscan_rows (partitions count as their parent)
+GUARDED_TABLES = {t.strip().lower() for t in os.getenv("QUERY_GUARDED_TABLES", "dq.bad_detail").split(",") if t.strip()}
+
+
+def cost_limits_for(role: Optional[str]) -> Dict[str, Optional[float]]:
+    """Return the cost thresholds for a role from QUERY_MAX_COST_<ROLE>, QUERY_MAX_ROWS_<ROLE>
+    and QUERY_MAX_SEQSCAN_ROWS_<ROLE> (0 = unlimited)."""
+    role = (role or "").lower()
+    limits = dict(DEFAULT_ROLE_COST_LIMITS.get(role, DEFAULT_ROLE_COST_LIMITS["inputter"]))
+    for key, env_name in (("max_cost", "QUERY_MAX_COST"), ("max_rows", "QUERY_MAX_ROWS"),
+                          ("max_seqscan_rows", "QUERY_MAX_SEQSCAN_ROWS")):
+        value = os.getenv(f"{env_name}_{role.upper()}") if role else None
+        if value is not None:
+            limits[key] = float(value) or None
+    return limits
+
+
+def statement_timeout_for(role: Optional[str]) -> int:
+    """Return the statement timeout (ms) for a role, from QUERY_TIMEOUT_<ROLE>_MS."""
+    role = (role or "").lower()
+    default = DEFAULT_ROLE_TIMEOUTS_MS.get(role, QUERY_TIMEOUT_DEFAULT_MS)
+    return int(os.getenv(f"QUERY_TIMEOUT_{role.upper()}_MS", str(default))) if role else default
+
+
+class ActiveQueryRegistry:
+    """Thread-safe registry of running ad-hoc queries and their backend PIDs."""
+
+    def __init__(self):
+        self._queries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, user, backend_pid: int, sql: str, timeout_ms: int) -> str:
+        query_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._queries[query_id] = {
+                "query_id": query_id,
+                "user_id": getattr(user, "id", None),
+                "username": getattr(user, "username", None),
+                "role": getattr(user, "role", None),
+                "backend_pid": backend_pid,
+                "sql": sql,
+                "timeout_ms": timeout_ms,
+                "started_at": time.time(),
+                "cancelled_by": None,
+            }
+        return query_id
+
+    def unregister(self, query_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._queries.pop(query_id, None)
+
+    def get(self, query_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._queries.get(query_id)
+            return dict(entry) if entry else None
+
+    def list(self, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Running queries (of one user if user_id is given), longest running first."""
+        now = time.time()
+        with self._lock:
+            entries = [dict(e) for e in self._queries.values() if user_id is None or e["user_id"] == user_id]
+        for entry in entries:
+            entry["elapsed_seconds"] = round(now - entry["started_at"], 1)
+        return sorted(entries, key=lambda e: e["started_at"])
+
+    def cancel(self, db, query_id: str, cancelled_by: str) -> bool:
+        """Cancel a running query with pg_cancel_backend. Returns False if it is no longer running."""
+        with self._lock:
+            entry = self._queries.get(query_id)
+            if entry is None:
+                return False
+            entry["cancelled_by"] = cancelled_by
+            # Signal while holding the lock so the PID cannot be unregistered and reused meanwhile
+            cursor = db.cursor()
+            try:
+                cursor.execute("SELECT pg_cancel_backend(%s)", (entry["backend_pid"],))
+                signalled = cursor.fetchone()[0]
+                db.commit()
+            finally:
+                cursor.close()
+        return bool(signalled)
+
+
+# Global registry of running ad-hoc queries
+active_queries = ActiveQueryRegistry()
+
+
+# Statements that end the guarded transaction or change the session for later queries
+_CONTROL_KEYWORDS = {
+    "begin", "start", "commit", "end", "rollback", "abort", "savepoint", "release", "prepare",
+    "set", "reset", "discard", "load", "listen", "unlisten", "lock",
+}
+_DOLLAR_TAG_RE = re.compile(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$")
+_FIRST_WORD_RE = re.compile(r"\s*([A-Za-z]+)")
+
+
+def _strip_statement(query: str) -> str:
+    """
+    The query with comments removed and string literals, quoted identifiers and
+    dollar-quoted bodies blanked out, so that ';' and keywords can be found reliably.
+    """
+    out = []
+    i, n = 0, len(query)
+    while i < n:
+        ch = query[i]
+        if query.startswith("--", i):
+            end = query.find("\n", i)
+            i = n if end == -1 else end
+        elif query.startswith("/*", i):
+            depth, i = 1, i + 2
+            while i < n and depth:
+                if query.startswith("/*", i):
+                    depth, i = depth + 1, i + 2
+                elif query.startswith("*/", i):
+                    depth, i = depth - 1, i + 2
+                else:
+                    i += 1
+            out.append(" ")
+        elif ch in ("'", '"'):
+            backslash = ch == "'" and i > 0 and query[i - 1] in "eE"
+            i += 1
+            while i < n:
+                if backslash and query[i] == "\\":
+                    i += 2
+                elif query[i] == ch:
+                    if query.startswith(ch * 2, i):
+                        i += 2
+                    else:
+                        break
+                else:
+                    i += 1
+            i += 1
+            out.append(" ")
+        elif ch == "$" and _DOLLAR_TAG_RE.match(query, i) and not (i and (query[i - 1].isalnum() or query[i - 1] == "_")):
+            tag = _DOLLAR_TAG_RE.match(query, i).group(0)
+            end = query.find(tag, i + len(tag))
+            i = n if end == -1 else end + len(tag)
+            out.append(" ")
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+def ensure_single_statement(query: str):
+    """
+    Reject input that is not exactly one statement, or that is transaction or session
+    control. The whole text is sent as one simple query, so a second statement after
+    "COMMIT;" would otherwise run outside the read-only transaction.
+    """
+    stripped = _strip_statement(query).strip().rstrip(";").strip()
+    if not stripped:
+        raise ValueError("The query is empty.")
+    if ";" in stripped:
+        raise ValueError("Only a single SQL statement can be run at a time.")
+    first_word = _FIRST_WORD_RE.match(stripped)
+    if first_word and first_word.group(1).lower() in _CONTROL_KEYWORDS:
+        raise ValueError(f"{first_word.group(1).upper()} statements cannot be run from the SQL editor.")
+
+
+def _end_guarded_transaction(db):
+    """Roll back and undo any session-level settings before the connection is reused."""
+    try:
+        db.rollback()
+        cursor = db.cursor()
+        try:
+            cursor.execute("RESET ALL")
+        finally:
+            cursor.close()
+        db.commit()
+    except psycopg2.Error:
+        pass
+
+
+def _begin_guarded_transaction(db, timeout_ms: int):
+    """Start a fresh read-only transaction with a local statement_timeout."""
+    status = db.info.transaction_status
+    if status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+        db.rollback()
+    elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        db.commit()  # keep work done earlier in the request on a shared connection
+    cursor = db.cursor()
+    try:
+        cursor.execute("SET TRANSACTION READ ONLY")
+        cursor.execute("SET LOCAL statement_timeout = %s", (timeout_ms,))
+    finally:
+        cursor.close()
+
+
+def _walk_plan(node: Dict[str, Any]):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk_plan(child)
+
+
+def explain_query(db, query: str) -> Optional[Dict[str, Any]]:
+    """
+    Run EXPLAIN (FORMAT JSON) and summarize the plan.
+    Returns None if the statement cannot be explained.
+    """
+    ensure_single_statement(query)
+    cursor = db.cursor()
+    try:
+        cursor.execute("SAVEPOINT dqx_explain")
+        try:
+            cursor.execute(f"EXPLAIN (FORMAT JSON, VERBOSE) {query}")
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            root = plan[0]["Plan"]
+            seq_scans = _seq_scans(cursor, root)
+        except (psycopg2.Error, LookupError, TypeError, ValueError):
+            # Not explainable as a single statement
+            cursor.execute("ROLLBACK TO SAVEPOINT dqx_explain")
+            return None
+        cursor.execute("RELEASE SAVEPOINT dqx_explain")
+
+        return {
+            "total_cost": root.get("Total Cost"),
+            "startup_cost": root.get("Startup Cost"),
+            "plan_rows": root.get("Plan Rows"),
+            "node_type": root.get("Node Type"),
+            "node_count": sum(1 for _ in _walk_plan(root)),
+            "seq_scans": seq_scans,
+        }
+    finally:
+        cursor.close()
+
+
+def _seq_scans(cursor, root: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Sequential scans in a plan with table sizes, partitions mapped to their partitioned parent."""
+    seq_scans = [
+        {
+            "schema": node.get("Schema"),
+            "relation": node.get("Relation Name"),
+            "plan_rows": node.get("Plan Rows"),
+            "total_cost": node.get("Total Cost"),
+        }
+        for node in _walk_plan(root) if node.get("Node Type") == "Seq Scan" and node.get("Relation Name")
+    ]
+    if not seq_scans:
+        return []
+    cursor.execute("""
+        SELECT n.nspname, c.relname, c.reltuples::bigint, rn.nspname || '.' || r.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_class r ON r.oid = COALESCE(pg_partition_root(c.oid), c.oid)
+        JOIN pg_namespace rn ON rn.oid = r.relnamespace
+        WHERE n.nspname = ANY(%s) AND c.relname = ANY(%s)
+    """, ([scan["schema"] for scan in seq_scans], [scan["relation"] for scan in seq_scans]))
+    tables = {(row[0], row[1]): (row[2], row[3]) for row in cursor.fetchall()}
+    for scan in seq_scans:
+        table_rows, root_table = tables.get((scan["schema"], scan["relation"]), (None, None))
+        scan["table_rows"] = max(table_rows or 0, scan["plan_rows"] or 0)
+        scan["table"] = root_table or f"{scan['schema']}.{scan['relation']}"
+        scan["guarded"] = scan["table"].lower() in GUARDED_TABLES
+    return seq_scans
+
+
+def check_plan(plan: Dict[str, Any], role: Optional[str]) -> List[str]:
+    """Return the role thresholds the plan exceeds (empty if none)."""
+    limits = cost_limits_for(role)
+    violations = []
+    if limits["max_cost"] and (plan["total_cost"] or 0) > limits["max_cost"]:
+        violations.append(f"estimated cost {plan['total_cost']:,.0f} exceeds {limits['max_cost']:,.0f}")
+    if limits["max_rows"] and (plan["plan_rows"] or 0) > limits["max_rows"]:
+        violations.append(f"estimated {plan['plan_rows']:,} result rows exceeds {limits['max_rows']:,.0f}")
+    if limits["max_seqscan_rows"]:
+        for scan in plan["seq_scans"]:
+            if scan["guarded"] and scan["table_rows"] > limits["max_seqscan_rows"]:
+                violations.append(f"sequential scan of {scan['table']} ({scan['table_rows']:,} rows) "
+                                  f"exceeds {limits['max_seqscan_rows']:,.0f} rows")
+    return violations
+
+
+def _guard_cost(db, query: str, user, confirmed: bool) -> Optional[Dict[str, Any]]:
+    """Explain the query and enforce the role's thresholds. Returns the plan summary."""
+    if QUERY_COST_GUARD == "off":
+        return None
+    plan = explain_query(db, query)
+    if plan is None:
+        # Fail closed: a statement without a readable plan is never run unchecked
+        plan = {"total_cost": None, "startup_cost": None, "plan_rows": None, "node_type": "unknown",
+                "node_count": 0, "seq_scans": [], "violations": ["the query plan could not be checked"]}
+    else:
+        plan["violations"] = check_plan(plan, getattr(user, "role", None))
+    if plan["violations"]:
+        message = "Query plan exceeds your limits: " + "; ".join(plan["violations"])
+        if QUERY_COST_GUARD == "reject":
+            raise QueryCostExceededError(message, plan, requires_confirmation=False)
+        if not confirmed:
+            raise QueryCostExceededError(message + ". Confirm to run it anyway.", plan, requires_confirmation=True)
+    return plan
+
+
+def _cancel_message(entry: Optional[Dict[str, Any]], timeout_ms: int) -> str:
+    if entry and entry.get("cancelled_by"):
+        return f"Query was cancelled by {entry['cancelled_by']}"
+    return (f"Query exceeded the {timeout_ms / 1000:g}s statement timeout for role "
+            f"'{entry.get('role') if entry else 'unknown'}' and was cancelled")
+
+
+def run_guarded_query(query: str, db, user, columnar: bool = False, confirmed: bool = False) -> Dict[str, Any]:
+    """
+    Run ad-hoc SQL read-only with the user's role timeout, registered as an active query.
+
+    Returns the crud.execute_query result plus a 'plan' summary (None if the cost
+    guard is off). Raises QueryCostExceededError when the plan is over the role's
+    thresholds (and not confirmed), QueryCancelledError on timeout or cancellation
+    and ValueError for other database errors.
+    """
+    ensure_single_statement(query)
+    timeout_ms = statement_timeout_for(getattr(user, "role", None))
+    _begin_guarded_transaction(db, timeout_ms)
+    query_id = active_queries.register(user, db.get_backend_pid(), query, timeout_ms)
+    try:
+        plan = _guard_cost(db, query, user, confirmed)
+        result = crud.execute_query(query, db, columnar=columnar)
+        result["plan"] = plan
+        return result
+    except ValueError as e:
+        if isinstance(e.__cause__, psycopg2.errors.QueryCanceled):
+            raise QueryCancelledError(_cancel_message(active_queries.get(query_id), timeout_ms)) from e
+        raise
+    finally:
+        active_queries.unregister(query_id)
+        _end_guarded_transaction(db)  # read-only: nothing to keep
+
+
+def _profile_nodes(root: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten an EXPLAIN ANALYZE plan into rows (depth-first) with inclusive and self times."""
+    nodes = []
+
+    def visit(node, depth):
+        loops = node.get("Actual Loops") or 0
+        total_ms = (node.get("Actual Total Time") or 0) * loops
+        children = node.get("Plans", [])
+        children_ms = sum((c.get("Actual Total Time") or 0) * (c.get("Actual Loops") or 0) for c in children)
+        relation = node.get("Relation Name")
+        nodes.append({
+            "depth": depth,
+            "node_type": node.get("Node Type"),
+            "relation": f"{node['Schema']}.{relation}" if relation and node.get("Schema") else relation,
+            "index": node.get("Index Name"),
+            "loops": loops,
+            "total_ms": round(total_ms, 3),
+            "self_ms": round(max(total_ms - children_ms, 0), 3),
+            "actual_rows": node.get("Actual Rows") or 0,  # per loop, like plan_rows
+            "plan_rows": node.get("Plan Rows"),
+            "shared_hit": node.get("Shared Hit Blocks", 0),
+            "shared_read": node.get("Shared Read Blocks", 0),
+            "temp_read": node.get("Temp Read Blocks", 0),
+            "temp_written": node.get("Temp Written Blocks", 0),
+        })
+        for child in children:
+            visit(child, depth + 1)
+
+    visit(root, 0)
+    return nodes
+
+
+def profile_query(query: str, db, user, confirmed: bool = False, hot_nodes: int = 3) -> Dict[str, Any]:
+    """
+    Run EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) read-only under the role's timeout and
+    cost guard, then roll back. Returns planning/execution times and the node tree;
+    the nodes with the largest self time are flagged 'hot'.
+    """
+    ensure_single_statement(query)
+    timeout_ms = statement_timeout_for(getattr(user, "role", None))
+    _begin_guarded_transaction(db, timeout_ms)
+    query_id = active_queries.register(user, db.get_backend_pid(), query, timeout_ms)
+    cursor = db.cursor()
+    try:
+        plan = _guard_cost(db, query, user, confirmed)
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}")
+            result = cursor.fetchone()[0]
+        except psycopg2.errors.QueryCanceled as e:
+            raise QueryCancelledError(_cancel_message(active_queries.get(query_id), timeout_ms)) from e
+        except psycopg2.Error as e:
+            raise ValueError(f"Database query failed: {str(e)}") from e
+        if isinstance(result, str):
+            result = json.loads(result)
+        explained = result[0]
+
+        nodes = _profile_nodes(explained["Plan"])
+        hottest = sorted(range(len(nodes)), key=lambda i: nodes[i]["self_ms"], reverse=True)[:hot_nodes]
+        execution_ms = explained.get("Execution Time") or 0
+        for i, node in enumerate(nodes):
+            node["hot"] = i in hottest and node["self_ms"] > 0
+            node["self_pct"] = round(100 * node["self_ms"] / execution_ms, 1) if execution_ms else 0.0
+        return {
+            "planning_ms": explained.get("Planning Time"),
+            "execution_ms": execution_ms,
+            "nodes": nodes,
+            "plan": plan,
+        }
+    finally:
+        cursor.close()
+        active_queries.unregister(query_id)
+        _end_guarded_transaction(db)  # EXPLAIN ANALYZE executed the statement; never keep its effects
+
+
+def stream_guarded_query(query: str, db, user, confirmed: bool = False, **stream_options):
+    """
+    crud.stream_query under the same read-only transaction, timeout and registry.
+    The timeout applies to each fetch from the server-side cursor.
+    """
+    ensure_single_statement(query)
+    timeout_ms = statement_timeout_for(getattr(user, "role", None))
+    _begin_guarded_transaction(db, timeout_ms)
+    query_id = active_queries.register(user, db.get_backend_pid(), query, timeout_ms)
+    try:
+        _guard_cost(db, query, user, confirmed)
+        column_names, chunks = crud.stream_query(query, db, **stream_options)
+    except ValueError as e:
+        entry = active_queries.unregister(query_id)
+        _end_guarded_transaction(db)
+        if isinstance(e, QueryCostExceededError):
+            raise
+        if isinstance(e.__cause__, psycopg2.errors.QueryCanceled):
+            raise QueryCancelledError(_cancel_message(entry, timeout_ms)) from e
+        raise
+
+    def registered_chunks():
+        try:
+            yield from chunks
+        finally:
+            active_queries.unregister(query_id)
+            _end_guarded_transaction(db)
+
+    return column_names, registered_chunks()
@@ -0,0 +1,170 @@
+"""
+Request-scoped database connection for the DQX application.
+
+Within one HTTP request the middleware, the auth dependencies and the route
+handler all need the application database. RequestDBMiddleware installs a
+RequestConnection for the request: the first consumer checks a connection out
+of the pool and every later consumer (get_db, UserMiddleware, the action log)
+reuses it. The connection goes back to the pool once, when the response has
+finished.
+
+The middleware also counts connections and queries per request. Totals are
+available from request_db_stats() and, when DB_REQUEST_STATS_HEADERS is
+enabled, each response carries X-DB-Connections and X-DB-Queries headers.
+"""
+
+import os
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+import psycopg2.extensions
+
+# Add X-DB-Connections / X-DB-Queries headers to every response
+REQUEST_STATS_HEADERS = os.getenv("DB_REQUEST_STATS_HEADERS", "false").lower() in ("1", "true", "yes", "on")
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """Cursor that counts executed statements against the current request."""
+
+    def execute(self, query, vars=None):
+        _count_query()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        _count_query()
+        return super().executemany(query, vars_list)
+
+    def callproc(self, procname, parameters=None):
+        _count_query()
+        return super().callproc(procname, parameters)
+
+
+class RequestConnection:
+    """Connection shared by everything that runs within one request."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+        self.connections = 0
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Return the request's connection, checking one out on first use."""
+        with self._lock:
+            if self.conn is None or self.conn.closed:
+                self.conn = self.pool.getconn()
+                self.conn.cursor_factory = CountingCursor
+                self.connections += 1
+            elif self.conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+                # An earlier consumer failed without rolling back
+                self.conn.rollback()
+            return self.conn
+
+    def release(self):
+        """Return the connection to the pool (called once per request)."""
+        with self._lock:
+            conn, self.conn = self.conn, None
+        if conn is not None:
+            conn.cursor_factory = psycopg2.extensions.cursor
+            self.pool.putconn(conn)
+
+
+_current: ContextVar[Optional[RequestConnection]] = ContextVar("dqx_request_connection", default=None)
+
+
+def current_request_connection() -> Optional[RequestConnection]:
+    """Return the RequestConnection of the request being handled, if any."""
+    return _current.get()
+
+
+def _count_query():
+    holder = _current.get()
+    if holder is not None:
+        holder.queries += 1
+
+
+class _RequestDBStats:
+    """Aggregate per-request connection and query counts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._requests = 0
+            self._requests_with_db = 0
+            self._connections = 0
+            self._queries = 0
+            self._max_connections = 0
+            self._max_queries = 0
+
+    def record(self, holder: RequestConnection):
+        with self._lock:
+            self._requests += 1
+            if holder.connections:
+                self._requests_with_db += 1
+            self._connections += holder.connections
+            self._queries += holder.queries
+            self._max_connections = max(self._max_connections, holder.connections)
+            self._max_queries = max(self._max_queries, holder.queries)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self._requests_with_db
+            return {
+                "requests": self._requests,
+                "requests_with_db": requests,
+                "connections": self._connections,
+                "queries": self._queries,
+                "avg_connections_per_request": round(self._connections / requests, 3) if requests else 0.0,
+                "avg_queries_per_request": round(self._queries / requests, 3) if requests else 0.0,
+                "max_connections_per_request": self._max_connections,
+                "max_queries_per_request": self._max_queries,
+            }
+
+
+_stats = _RequestDBStats()
+
+
+def request_db_stats() -> Dict[str, Any]:
+    """Return aggregate connection/query counts for all handled requests."""
+    return _stats.snapshot()
+
+
+class RequestDBMiddleware:
+    """
+    ASGI middleware that gives each HTTP request one shared database connection.
+
+    It must be the outermost middleware so that every other middleware runs
+    inside the request context.
+    """
+
+    def __init__(self, app, pool):
+        self.app = app
+        self.pool = pool
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        holder = RequestConnection(self.pool)
+        token = _current.set(holder)
+
+        async def send_with_stats(message):
+            if REQUEST_STATS_HEADERS and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-connections", str(holder.connections).encode()))
+                headers.append((b"x-db-queries", str(holder.queries).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current.reset(token)
+            holder.release()
+            _stats.record(holder)
@@ -0,0 +1,224 @@
+"""
+In-process cache of read-query results for the DQX application.
+
+The bad detail, visualization and stats pages rerun the same queries over
+dq.bad_detail and the reference tables on every load, while those tables only
+change on publish and on reference-table edits. Results are cached keyed by
+normalized SQL plus params, with LRU eviction under a memory budget
+(RESULT_CACHE_MAX_BYTES) and a TTL (RESULT_CACHE_TTL) as a backstop.
+
+Every table has a data version. An entry is stamped with the versions of the
+tables its query reads (taken before the query runs) and is only served while
+they are unchanged. bump() increments a table's version and drops its entries
+under the same lock, so once publish_script_results or a reference edit has
+bumped, no reader sees a result computed before the change.
+
+Writes from other processes (other uvicorn workers, the scheduler, psql) are
+seen through dq.data_versions (data_versions_migration.sql), a view over one
+sequence per cached table. Statement triggers call nextval() on it (no row lock,
+so writers never queue behind each other), and crud.bump_data_version bumps it
+again after the application commits a change, since trigger bumps land before
+the commit. crud/async_crud read the counters of a query's tables before each lookup
+(at most every RESULT_CACHE_VERSION_CHECK seconds; 0 = every lookup) and pass
+them to sync_versions(), which bumps every table whose counter moved. Without
+that table the cache is only correct with a single worker and no external
+writers, and falls back to the TTL.
+
+Cached values are shared between callers and must be treated as read-only.
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_VERSION_CHECK = float(os.getenv("RESULT_CACHE_VERSION_CHECK", "0"))
+
+# Shared data versions of the tables a query reads (see sync_versions)
+DATA_VERSIONS_QUERY = "SELECT table_name, version FROM dq.data_versions WHERE table_name = ANY(%s)"
+
+# Whitespace outside of quoted literals/identifiers collapses to one space
+_NORMALIZE_RE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|\s+""")
+_TABLE_RE = re.compile(r"""\b(?:from|join)\s+((?:"?\w+"?\.)?"?\w+"?)""", re.IGNORECASE)
+
+
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace (outside literals) and drop a trailing semicolon."""
+    normalized = _NORMALIZE_RE.sub(lambda m: m.group(1) or " ", query).strip()
+    return normalized.rstrip(";").rstrip()
+
+
+def tables_read(query: str) -> Tuple[str, ...]:
+    """Tables named after FROM/JOIN, lower-cased without quotes (e.g. 'dq.bad_detail')."""
+    return tuple(sorted({name.replace('"', '').lower() for name in _TABLE_RE.findall(query)}))
+
+
+def _freeze(params: Optional[Sequence[Any]]) -> Hashable:
+    if params is None:
+        return ()
+    return tuple(tuple(p) if isinstance(p, list) else p for p in params)
+
+
+def cache_key(query: str, params: Optional[Sequence[Any]] = None) -> tuple:
+    """Key for a query: normalized SQL plus params."""
+    return normalize_sql(query), _freeze(params)
+
+
+def _estimate_size(value: Any) -> int:
+    """Rough deep size of a result (dicts, lists and scalars) in bytes."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        # Row dicts share their key strings, so only the values are counted
+        size += sum(_estimate_size(v) for v in value.values())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_estimate_size(v) for v in value)
+    return size
+
+
+class ResultCache:
+    """Thread-safe LRU cache of query results with a byte budget, TTL and per-table data versions."""
+
+    def __init__(self, ttl: float = RESULT_CACHE_TTL, max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 version_check: float = RESULT_CACHE_VERSION_CHECK):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.version_check = version_check
+        # False once dq.data_versions turned out to be missing
+        self.shared_versions = True
+        self._db_versions: Dict[str, int] = {}
+        self._checked_at: Dict[str, float] = {}
+        # key -> (cached_at, tables, stamp, size, value)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_bytes > 0
+
+    def stamp(self, query: str) -> Tuple[Tuple[str, int], ...]:
+        """Current versions of the tables a query reads; take it before running the query."""
+        tables = tables_read(query)
+        with self._lock:
+            return tuple((table, self._versions.get(table, 0)) for table in tables)
+
+    def get(self, query: str, params: Optional[Sequence[Any]] = None) -> Optional[Any]:
+        """Return the cached result, or None if missing, expired or stale."""
+        if not self.enabled:
+            return None
+        key = cache_key(query, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            cached_at, _, stamp, _, value = entry
+            if time.monotonic() - cached_at >= self.ttl or not self._is_current(stamp):
+                self._remove(key)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, query: str, params: Optional[Sequence[Any]], value: Any, stamp: Tuple[Tuple[str, int], ...]):
+        """Cache a result computed while the tables were at `stamp` (ignored if they changed since)."""
+        if not self.enabled or value is None:
+            return
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        key = cache_key(query, params)
+        with self._lock:
+            if not self._is_current(stamp):
+                return  # a publish landed while the query ran
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), tuple(table for table, _ in stamp), stamp, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def bump(self, *tables: str):
+        """Mark tables as changed: bump their data version and drop every entry that reads them."""
+        tables = {table.lower() for table in tables}
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+            for key in [key for key, entry in self._entries.items() if tables.intersection(entry[1])]:
+                self._remove(key)
+                self._invalidations += 1
+
+    def tables_to_check(self, query: str) -> Tuple[str, ...]:
+        """Tables of a query whose shared version should be read from dq.data_versions now."""
+        if not self.enabled or not self.shared_versions:
+            return ()
+        now = time.monotonic()
+        with self._lock:
+            return tuple(table for table in tables_read(query)
+                         if now - self._checked_at.get(table, float("-inf")) >= self.version_check)
+
+    def sync_versions(self, tables: Sequence[str], versions: Dict[str, int]):
+        """
+        Apply shared versions read for `tables` (missing ones count as 0): bump every table
+        whose version differs from the one last seen, dropping its entries.
+        """
+        now = time.monotonic()
+        changed = []
+        with self._lock:
+            for table in tables:
+                version = versions.get(table, 0)
+                if self._db_versions.get(table) != version:
+                    self._db_versions[table] = version
+                    changed.append(table)
+                self._checked_at[table] = now
+        if changed:
+            self.bump(*changed)
+
+    def disable_shared_versions(self):
+        if self.shared_versions:
+            self.shared_versions = False
+            print("dq.data_versions not found; run data_versions_migration.sql so the result cache sees "
+                  "writes from other processes (until then they are only picked up after RESULT_CACHE_TTL)")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _is_current(self, stamp) -> bool:
+        return all(self._versions.get(table, 0) == version for table, version in stamp)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ttl": self.ttl,
+                "max_bytes": self.max_bytes,
+                "bytes": self._bytes,
+                "size": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "versions": dict(self._versions),
+                "shared_versions": self.shared_versions,
+            }
+
+
+# Global instance shared by crud, async_crud and the reference-table routes
+result_cache = ResultCache()
@@ -2,19 +2,19 @@
 Authentication routes for DQX
 """
 
+import time
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, Request, Form, status, Response, Cookie
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from typing import Optional
-from jose import JWTError, jwt
 
-from app import crud
-from app.auth import authenticate_user, create_access_token, get_current_active_user
+from app.auth import authenticate_user, create_access_token, decode_access_token, get_current_active_user
 from app.database import get_db
 from app.dependencies import templates, render_template
 from app.models import User
 from app.schemas import Token, UserCreate
+from app.token_revocation import token_revocations
 
 # Constants
 ACCESS_TOKEN_EXPIRE_MINUTES = 60  # Changed from 30 to 60 minutes (1 hour)
@@ -113,8 +113,14 @@ def register(request: Request):
     )
 
 @public_router.get("/logout")
-def logout():
-    """Log out by clearing the authentication cookie."""
+def logout(access_token: Optional[str] = Cookie(None)):
+    """Log out by clearing the authentication cookie and revoking the token."""
+    if access_token:
+        token = access_token[7:] if access_token.startswith("Bearer ") else access_token
+        payload = decode_access_token(token)
+        if payload is not None:
+            token_revocations.revoke_token(token, payload.get("exp"))
+    
     response = RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
     response.delete_cookie(key="access_token")
     return response
@@ -128,38 +134,23 @@ def profile_page(request: Request, current_user: User = Depends(get_current_acti
     )
 
 @public_router.get("/api/auth/session-check")
-def check_session_status(
-    access_token: Optional[str] = Cookie(None),
-    db = Depends(get_db)
-):
+def check_session_status(access_token: Optional[str] = Cookie(None)):
     """
     Check if the current session is valid.
-    Returns a JSON response with a valid flag.
-    Used by the frontend to check if the session is still active.
+    Returns a JSON response with a valid flag and the seconds until the token
+    expires, so the frontend can schedule its next check.
+    Only the token signature, expiry and the revocation list are checked,
+    so this endpoint never touches the database.
     """
     if not access_token:
         return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"valid": False})
     
     # Extract the token from the "Bearer <token>" format
-    if access_token.startswith("Bearer "):
-        token = access_token[7:]
-    else:
-        token = access_token
+    token = access_token[7:] if access_token.startswith("Bearer ") else access_token
     
-    try:
-        # Verify the token
-        from app.auth import SECRET_KEY, ALGORITHM
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        
-        if username is None:
-            return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"valid": False})
-            
-        # Check if user exists
-        user = crud.get_user_by_username(db, username)
-        if user is None or not user.is_active:
-            return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"valid": False})
-            
-        return JSONResponse(status_code=status.HTTP_200_OK, content={"valid": True})
-    except JWTError:
+    payload = decode_access_token(token)
+    if payload is None or payload.get("sub") is None:
         return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"valid": False})
+    
+    expires_in = max(0, int(payload["exp"] - time.time())) if "exp" in payload else None
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"valid": True, "expires_in": expires_in})
@@ -4,21 +4,21 @@ Routes for bad detail query functionality
 from fastapi import APIRouter, Request, Depends, Form, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
 from typing import Optional, List
-from app import crud
-from app.database import get_db
+from app import async_crud
+from app.async_database import get_async_db
 from app.dependencies import templates, render_template
 
 # Router for HTML pages
 router = APIRouter(tags=["Pages"])
 
-def fetch_filter_options(db, filter_name, search_term=None):
+async def fetch_filter_options(db, filter_name, search_term=None):
     """Helper function to fetch filter options with optional search filtering"""
     options = []
     try:
         if filter_name == "rule_id":
             # Get rule_id and rule_name for filter options
             query = "SELECT rule_id, rule_name FROM dq.rule_ref ORDER BY rule_id"
-            results = crud.execute_query(query, db)
+            results = await async_crud.execute_cached_query(query, db)
             if results and results.get('data'):
                 # Create options with ID and name
                 options = [(row.get('rule_id'), f"{row.get('rule_id')} - {row.get('rule_name')}") 
@@ -26,7 +26,7 @@ def fetch_filter_options(db, filter_name, search_term=None):
         elif filter_name == "source_id":
             # Get source_id and source_name for filter options
             query = "SELECT source_id, source_name FROM dq.source_ref ORDER BY source_id"
-            results = crud.execute_query(query, db)
+            results = await async_crud.execute_cached_query(query, db)
             if results and results.get('data'):
                 # Create options with ID and name
                 options = [(row.get('source_id'), f"{row.get('source_id')} - {row.get('source_name')}") 
@@ -34,7 +34,7 @@ def fetch_filter_options(db, filter_name, search_term=None):
         else:
             # For other filters, use the original approach
             query = f"SELECT DISTINCT {filter_name} FROM dq.bad_detail ORDER BY {filter_name}"
-            results = crud.execute_query(query, db)
+            results = await async_crud.execute_cached_query(query, db)
             if results and results.get('data'):
                 options = [(row.get(filter_name), row.get(filter_name)) 
                           for row in results['data'] if row.get(filter_name)]
@@ -48,7 +48,7 @@ def fetch_filter_options(db, filter_name, search_term=None):
         print(f"Error fetching {filter_name}: {str(e)}")
     return options
 
-def execute_bad_detail_query(db, rule_id=None, source_id=None):
+async def execute_bad_detail_query(db, rule_id=None, source_id=None):
     """Helper function to execute the main query with filters"""
     headers = []
     data = []
@@ -73,7 +73,7 @@ def execute_bad_detail_query(db, rule_id=None, source_id=None):
         if conditions:
             query_str += " WHERE " + " AND ".join(conditions)
         query_str += " LIMIT 1000;"
-        results = crud.execute_query(query_str, db, params)
+        results = await async_crud.execute_cached_query(query_str, db, params)
         if results and results.get('data'):
             headers = results['data'][0].keys()
             data = [row.values() for row in results['data']]
@@ -87,7 +87,7 @@ async def bad_detail_query_page(
     source_id: Optional[str] = None,
     search_term: Optional[str] = None,
     page: int = 1,
-    db = Depends(get_db)
+    db = Depends(get_async_db)
 ):
     """
     Display the bad detail query page with optional filtering by rule_id and source_id.
@@ -104,11 +104,11 @@ async def bad_detail_query_page(
         HTML response with the bad detail query page
     """
     # Get filter options
-    rule_ids = fetch_filter_options(db, "rule_id", search_term)
-    source_ids = fetch_filter_options(db, "source_id", search_term)
+    rule_ids = await fetch_filter_options(db, "rule_id", search_term)
+    source_ids = await fetch_filter_options(db, "source_id", search_term)
     
     # Execute main query
-    headers, data = execute_bad_detail_query(db, rule_id, source_id)
+    headers, data = await execute_bad_detail_query(db, rule_id, source_id)
 
     # Add pagination if needed
     items_per_page = 20
@@ -149,7 +149,7 @@ async def search_options(
     request: Request,
     field: str,
     search_term: Optional[str] = None,
-    db = Depends(get_db)
+    db = Depends(get_async_db)
 ):
     """
     Search for rule_id or source_id options based on search term.
@@ -169,7 +169,7 @@ async def search_options(
         options = []
     else:
         # Reuse the helper function to fetch filtered options
-        options = fetch_filter_options(db, field, search_term)
+        options = await fetch_filter_options(db, field, search_term)
     
     # Return a simple HTML fragment with the filtered options
     return render_template(
@@ -6,6 +6,7 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 from typing import Optional, Dict, Any
 
 from app.database import get_db
+from app import crud
 from ..dependencies import templates, render_template
 
 # Constants for queries
@@ -82,6 +83,7 @@ def add_rule(
         """
         cursor.execute(insert_query, (rule_id, rule_name, rule_desc))
         db.commit()
+        crud.bump_data_version(db, "dq.rule_ref")
         return RedirectResponse(url="/references/", status_code=303)
     except Exception as e:
         db.rollback()
@@ -132,6 +134,7 @@ def add_source(
         """
         cursor.execute(insert_query, (source_id, source_name, source_desc))
         db.commit()
+        crud.bump_data_version(db, "dq.source_ref")
         return RedirectResponse(url="/references/", status_code=303)
     except Exception as e:
         db.rollback()
@@ -177,6 +180,7 @@ def delete_rule(
         # Execute delete query
         cursor.execute(DELETE_RULE_QUERY, (rule_id,))
         db.commit()
+        crud.bump_data_version(db, "dq.rule_ref")
         return RedirectResponse(url="/references/", status_code=303)
     except Exception as e:
         db.rollback()
@@ -218,6 +222,7 @@ def delete_source(
         # Execute delete query
         cursor.execute(DELETE_SOURCE_QUERY, (source_id,))
         db.commit()
+        crud.bump_data_version(db, "dq.source_ref")
         return RedirectResponse(url="/references/", status_code=303)
     except Exception as e:
         db.rollback()
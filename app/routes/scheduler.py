@@ -152,7 +152,7 @@ def api_delete_schedule(schedule_id: int, db = Depends(get_db), user = Depends(c
     return {"message": "Schedule deleted successfully"}
 
 @router.get("/api/schedule-run-logs")
-async def get_schedule_run_logs_api(
+def get_schedule_run_logs_api(
     current_user=Depends(get_current_user_from_cookie),
     db=Depends(get_db),
     limit: int = Query(20, ge=1, le=100),
@@ -1,6 +1,7 @@
 """
 Routes for source data management functionality with multi-database support
 """
+import asyncio
 from fastapi import APIRouter, Request, Depends, Form, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from typing import Optional, List, Dict, Any
@@ -17,7 +18,6 @@ router = APIRouter(tags=["Pages"])
 @router.get("/source_data_management", response_class=HTMLResponse)
 async def source_data_management_page(
     request: Request, 
-    db = Depends(get_db),
     user = Depends(can_admin_creator_access)
 ):
     """
@@ -26,7 +26,6 @@ async def source_data_management_page(
     
     Args:
         request: The FastAPI request object
-        db: Database connection (for authentication/session)
         
     Returns:
         HTML response with the source data management page
@@ -40,47 +39,38 @@ async def source_data_management_page(
     # Get all available database connections for data querying
     all_connections = db_manager.get_all_connections()
     
+    # Discover the target and all source catalogs concurrently, each with its own deadline,
+    # so one slow or unreachable database can't stall the page
+    discoveries = []
+    if target_connection:
+        discoveries.append(db_manager.discover_catalog(target_connection['id'], include_tables_for='stg'))
+    discoveries.extend(db_manager.discover_catalog(conn['id']) for conn in source_connections)
+    results = await asyncio.gather(*discoveries)
+    
     # Get target database info with schemas and tables
     target_data = None
     if target_connection:
-        try:
-            target_id = target_connection['id']
-            schemas = db_manager.get_schemas(target_id)
-            stg_tables = db_manager.get_tables(target_id, 'stg') if 'stg' in schemas else []
-            
-            target_data = {
-                'connection': target_connection,
-                'schemas': schemas,
-                'stg_tables': stg_tables,
-                'has_stg_schema': 'stg' in schemas
-            }
-        except Exception as e:
-            print(f"Error fetching target database data: {str(e)}")
-            target_data = {
-                'connection': target_connection,
-                'schemas': [],
-                'stg_tables': [],
-                'has_stg_schema': False,
-                'error': str(e)
-            }
+        target_result = results[0]
+        results = results[1:]
+        target_data = {
+            'connection': target_connection,
+            'schemas': target_result['schemas'],
+            'stg_tables': target_result['tables'],
+            'has_stg_schema': 'stg' in target_result['schemas'],
+            'timed_out': target_result['timed_out']
+        }
+        if target_result['error']:
+            target_data['error'] = target_result['error']
     
-    # Get source database info
+    # Get source database info (partial results: failed or timed out sources are marked)
     source_data = []
-    for conn in source_connections:
-        try:
-            schemas = db_manager.get_schemas(conn['id'])
-            source_data.append({
-                'connection': conn,
-                'schemas': schemas,
-                'error': None
-            })
-        except Exception as e:
-            print(f"Error fetching data for source connection {conn['id']}: {str(e)}")
-            source_data.append({
-                'connection': conn,
-                'schemas': [],
-                'error': str(e)
-            })
+    for conn, result in zip(source_connections, results):
+        source_data.append({
+            'connection': conn,
+            'schemas': result['schemas'],
+            'error': result['error'],
+            'timed_out': result['timed_out']
+        })
     
     return render_template("source_data_management.html", {
         "request": request,
@@ -117,28 +107,22 @@ async def create_table(
                 content={"success": False, "message": "Invalid table name. Use only letters, numbers, and underscores."}
             )
         
-        # Get the target database connection
-        target_conn = db_manager.get_target_connection()
-        if not target_conn:
-            return JSONResponse(
-                status_code=500,
-                content={"success": False, "message": "Target database connection not available"}
-            )
-        
         try:
-            cursor = target_conn.cursor()
+            # Use the target database's async pool so table creation doesn't block the event loop
+            async with db_manager.async_target_connection() as target_conn:
+                async with target_conn.cursor() as cursor:
+                    # Ensure the stg schema exists
+                    await cursor.execute("CREATE SCHEMA IF NOT EXISTS stg")
+                    
+                    # Create the table in the target database
+                    # The SQL script should be a SELECT statement that can reference source databases
+                    create_query = f"CREATE TABLE IF NOT EXISTS stg.{table_name} AS {sql_script}"
+                    await cursor.execute(create_query)
+                
+                await target_conn.commit()
             
-            # Ensure the stg schema exists
-            cursor.execute("CREATE SCHEMA IF NOT EXISTS stg")
-            
-            # Create the table in the target database
-            # The SQL script should be a SELECT statement that can reference source databases
-            create_query = f"CREATE TABLE IF NOT EXISTS stg.{table_name} AS {sql_script}"
-            cursor.execute(create_query)
-            
-            target_conn.commit()
-            cursor.close()
-            target_conn.close()
+            # The stg schema changed - drop its cached table list
+            db_manager.invalidate_target_catalog('stg')
             
             target_info = db_manager.get_target_connection_info()
             target_name = target_info['name'] if target_info else 'target database'
@@ -147,9 +131,12 @@ async def create_table(
                 content={"success": True, "message": f"Table stg.{table_name} created successfully in {target_name}."}
             )
             
+        except ValueError:
+            return JSONResponse(
+                status_code=500,
+                content={"success": False, "message": "Target database connection not available"}
+            )
         except Exception as e:
-            target_conn.rollback()
-            target_conn.close()
             return JSONResponse(
                 status_code=500,
                 content={"success": False, "message": f"Error creating table: {str(e)}"}
@@ -162,7 +149,7 @@ async def create_table(
         )
 
 @router.post("/source_data_management/insert_data")
-async def insert_data(
+def insert_data(
     request: Request,
     user = Depends(can_admin_creator_access),
     db = Depends(get_db),
@@ -228,7 +215,7 @@ async def insert_data(
         )
 
 @router.post("/source_data_management/truncate_table")
-async def truncate_table(
+def truncate_table(
     request: Request,
     db = Depends(get_db),
     table_name: str = Form(...),
@@ -270,7 +257,7 @@ async def truncate_table(
         )
 
 @router.post("/source_data_management/drop_table")
-async def drop_table(
+def drop_table(
     request: Request,
     db = Depends(get_db),
     table_name: str = Form(...),
@@ -301,6 +288,9 @@ async def drop_table(
         db.commit()
         cursor.close()
         
+        # The stg schema changed - drop its cached table list
+        db_manager.invalidate_target_catalog('stg')
+        
         return JSONResponse(
             content={"success": True, "message": f"Table stg.{table_name} dropped successfully."}
         )
@@ -312,7 +302,7 @@ async def drop_table(
         )
 
 @router.get("/source_data_management/view_data/{table_name}")
-async def view_table_data(
+def view_table_data(
     request: Request,
     table_name: str,
     db = Depends(get_db),
@@ -385,7 +375,7 @@ async def get_database_connections(request: Request, user = Depends(can_admin_cr
 async def get_connection_schemas(connection_id: str, request: Request, user = Depends(can_admin_creator_access)):
     """Get all schemas for a specific database connection"""
     try:
-        schemas = db_manager.get_schemas(connection_id)
+        schemas = await db_manager.get_schemas_async(connection_id)
         return JSONResponse(content={"success": True, "schemas": schemas})
     except Exception as e:
         return JSONResponse(
@@ -397,7 +387,7 @@ async def get_connection_schemas(connection_id: str, request: Request, user = De
 async def get_schema_tables(connection_id: str, schema_name: str, request: Request, user = Depends(can_admin_creator_access)):
     """Get all tables for a specific schema in a database connection"""
     try:
-        tables = db_manager.get_tables(connection_id, schema_name)
+        tables = await db_manager.get_tables_async(connection_id, schema_name)
         return JSONResponse(content={"success": True, "tables": tables})
     except Exception as e:
         return JSONResponse(
@@ -405,8 +395,42 @@ async def get_schema_tables(connection_id: str, schema_name: str, request: Reque
             content={"success": False, "message": f"Error fetching tables: {str(e)}"}
         )
 
+@router.post("/api/database_connections/{connection_id}/catalog/refresh")
+async def refresh_connection_catalog(
+    connection_id: str,
+    request: Request,
+    schema: Optional[str] = None,
+    user = Depends(can_admin_creator_access)
+):
+    """Drop the cached catalog for a connection and reload schemas (and optionally one schema's tables)"""
+    try:
+        result = await db_manager.refresh_catalog(connection_id, schema)
+        return JSONResponse(content={"success": True, **result})
+    except ValueError as e:
+        return JSONResponse(status_code=404, content={"success": False, "message": str(e)})
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"Error refreshing catalog: {str(e)}"}
+        )
+
+@router.post("/api/database_connections/test_all")
+async def test_all_database_connections(request: Request, user = Depends(can_admin_creator_access)):
+    """Test every source database connection in parallel and report latency per source"""
+    try:
+        results = await db_manager.test_all_connections()
+        return JSONResponse(content={
+            "success": all(result["success"] for result in results),
+            "results": results
+        })
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "message": f"Error testing connections: {str(e)}"}
+        )
+
 @router.post("/api/database_connections/{connection_id}/test")
-async def test_database_connection(connection_id: str, request: Request, user = Depends(can_admin_creator_access)):
+def test_database_connection(connection_id: str, request: Request, user = Depends(can_admin_creator_access)):
     """Test a specific database connection"""
     try:
         result = db_manager.test_connection(connection_id)
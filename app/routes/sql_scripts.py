@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from typing import List, Optional
-from app import crud, schemas
+from app import crud, async_crud, query_guard, schemas
 from app.database import get_db
+from app.async_database import get_async_db
+from app.multi_db_manager import db_manager
+from app.batch_executor import batch_executor
 from app.dependencies import templates, render_template
 from app.dependencies_auth import get_current_user_from_cookie
 from app.role_permissions import can_admin_creator_access
@@ -19,7 +22,7 @@ SQL_EDITOR_TEMPLATE = "sql_editor.html"
 # --- Page Endpoints ---
 
 @page_router.get("/editor", response_class=HTMLResponse)
-async def sql_editor_page(request: Request, script_id: Optional[int] = None, db = Depends(get_db)):
+async def sql_editor_page(request: Request, script_id: Optional[int] = None, db = Depends(get_async_db)):
     # Fix for the decode attribute error by properly checking and converting script_id
     if script_id is not None:
         if isinstance(script_id, bytes):
@@ -29,10 +32,10 @@ async def sql_editor_page(request: Request, script_id: Optional[int] = None, db
         except (ValueError, TypeError):
             script_id = None
             
-    scripts = crud.get_sql_scripts(db)
+    scripts = await async_crud.get_sql_scripts(db)
     selected_script = None
     if script_id:
-        selected_script = crud.get_sql_script(db, script_id)
+        selected_script = await async_crud.get_sql_script(db, script_id)
     return render_template(SQL_EDITOR_TEMPLATE, {
         "request": request, 
         "scripts": scripts, 
@@ -42,7 +45,7 @@ async def sql_editor_page(request: Request, script_id: Optional[int] = None, db
     })
 
 @page_router.post("/editor/save")
-async def save_script_form(
+def save_script_form(
     script_id: Optional[int] = Form(None),
     name: str = Form(...),
     description: Optional[str] = Form(None),
@@ -55,25 +58,35 @@ async def save_script_form(
         crud.update_sql_script(db, script_id, script_data.model_dump(), user=user)
     else:
         crud.create_sql_script(db, script_data.model_dump(), user=user)
+        db_manager.invalidate_target_catalog('stg')  # new staging table
     return RedirectResponse(url="/editor", status_code=303)
 
 @page_router.post("/editor/execute")
-async def execute_script_form(
+def execute_script_form(
     request: Request,
     content: str = Form(...),
-    db = Depends(get_db)
+    confirmed: bool = Form(False),
+    db = Depends(get_db),
+    user = Depends(get_current_user_from_cookie)
 ):
     scripts = crud.get_sql_scripts(db)
     results = None
     error = None
+    plan = None
+    confirm_required = False
     try:
-        query_results = crud.execute_query(content, db)
-        if "data" in query_results and "columns" in query_results:
-            # Transform the data to the format expected by the template
-            results = {
-                "headers": query_results["columns"],
-                "rows": [list(row.values()) for row in query_results["data"]]
-            }
+        # Read-only, with the role's statement timeout and cost guard; cancellable from the running-query list
+        query_results = query_guard.run_guarded_query(content, db, user, columnar=True, confirmed=confirmed)
+        plan = query_results["plan"]
+        # Columnar results are already in the format expected by the template
+        results = {
+            "headers": query_results["columns"],
+            "rows": query_results["rows"]
+        }
+    except query_guard.QueryCostExceededError as e:
+        error = str(e)
+        plan = e.plan
+        confirm_required = e.requires_confirmation
     except Exception as e:
         error = str(e)
     
@@ -83,32 +96,71 @@ async def execute_script_form(
         "scripts": scripts, 
         "selected_script": {"content": content}, # Pass back the executed script
         "results": results,
-        "error": error
+        "error": error,
+        "plan": plan,
+        "confirm_required": confirm_required
+    })
+
+@page_router.post("/editor/profile")
+def profile_script_form(
+    request: Request,
+    content: str = Form(...),
+    confirmed: bool = Form(False),
+    db = Depends(get_db),
+    user = Depends(get_current_user_from_cookie)
+):
+    scripts = crud.get_sql_scripts(db)
+    profile = None
+    error = None
+    plan = None
+    confirm_required = False
+    try:
+        # EXPLAIN ANALYZE runs the statement, so it gets the same read-only guard and is rolled back
+        profile = query_guard.profile_query(content, db, user, confirmed=confirmed)
+        plan = profile["plan"]
+    except query_guard.QueryCostExceededError as e:
+        error = str(e)
+        plan = e.plan
+        confirm_required = e.requires_confirmation
+    except Exception as e:
+        error = str(e)
+
+    return render_template(SQL_EDITOR_TEMPLATE, {
+        "request": request,
+        "scripts": scripts,
+        "selected_script": {"content": content},
+        "results": None,
+        "profile": profile,
+        "error": error,
+        "plan": plan,
+        "confirm_required": confirm_required,
+        "confirm_action": "/editor/profile"
     })
 
 @page_router.get("/editor/delete/{script_id}")
-async def delete_script_form(script_id: int, db = Depends(get_db), user = Depends(can_admin_creator_access)):
+def delete_script_form(script_id: int, db = Depends(get_db), user = Depends(can_admin_creator_access)):
     crud.delete_sql_script(db, script_id)
+    db_manager.invalidate_target_catalog('stg')  # staging table dropped
     return RedirectResponse(url="/editor", status_code=303)
 
 # Add populate and publish page routes
 @page_router.get("/editor/{script_id}/populate")
-async def populate_table_form(request: Request, script_id: int, db = Depends(get_db), user = Depends(can_admin_creator_access)):
+def populate_table_form(request: Request, script_id: int, full_refresh: bool = False, db = Depends(get_db), user = Depends(can_admin_creator_access)):
     try:
         # Get script name for better messaging
         selected_script = crud.get_sql_script(db, script_id)
         script_name = selected_script.get("name", f"Script #{script_id}")
         
         # Execute the populate function
-        result = crud.populate_script_result_table(db, script_id)
+        result = crud.populate_script_result_table(db, script_id, full_refresh=full_refresh)
         
         # Get all scripts for page rendering
         scripts = crud.get_sql_scripts(db)
         
         # Success message with row count if available
         success_message = f"Successfully populated staging table with data from '{script_name}'."
-        if result and "rows_affected" in result:
-            success_message += f" {result['rows_affected']} rows processed."
+        if result and "inserted_rows" in result:
+            success_message += f" {result['inserted_rows']} rows processed ({result.get('mode', 'full')})."
         
         return render_template(SQL_EDITOR_TEMPLATE, {
             "request": request, 
@@ -130,7 +182,7 @@ async def populate_table_form(request: Request, script_id: int, db = Depends(get
         })
 
 @page_router.get("/editor/{script_id}/publish")
-async def publish_results_form(request: Request, script_id: int, db = Depends(get_db), user = Depends(can_admin_creator_access)):
+def publish_results_form(request: Request, script_id: int, db = Depends(get_db), user = Depends(can_admin_creator_access)):
     try:
         # Get script name for better messaging
         selected_script = crud.get_sql_script(db, script_id)
@@ -144,8 +196,8 @@ async def publish_results_form(request: Request, script_id: int, db = Depends(ge
         
         # Success message with row count if available
         success_message = f"Successfully published results from '{script_name}' to production table."
-        if result and "rows_affected" in result:
-            success_message += f" {result['rows_affected']} rows moved to production."
+        if result and "published_rows" in result:
+            success_message += f" {result['published_rows']} rows moved to production ({result.get('mode', 'full')})."
         
         return render_template(SQL_EDITOR_TEMPLATE, {
             "request": request, 
@@ -172,6 +224,61 @@ async def publish_results_form(request: Request, script_id: int, db = Depends(ge
 def get_scripts(db = Depends(get_db)):
     return crud.get_sql_scripts(db)
 
+@api_router.get("/running")
+def list_running_queries(user = Depends(get_current_user_from_cookie)):
+    """Running ad-hoc queries: all of them for admins, otherwise the user's own."""
+    if user.role == "admin":
+        return query_guard.active_queries.list()
+    return query_guard.active_queries.list(user_id=user.id)
+
+@api_router.post("/running/{query_id}/cancel")
+def cancel_running_query(query_id: str, db = Depends(get_db), user = Depends(get_current_user_from_cookie)):
+    """Cancel a running ad-hoc query (pg_cancel_backend). Admins can cancel any query."""
+    entry = query_guard.active_queries.get(query_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Query is not running")
+    if user.role != "admin" and entry["user_id"] != user.id:
+        raise HTTPException(status_code=403, detail="You can only cancel your own queries")
+    if not query_guard.active_queries.cancel(db, query_id, user.username):
+        raise HTTPException(status_code=404, detail="Query is not running")
+    return {"message": "Cancel requested", "query_id": query_id}
+
+@api_router.post("/batch", status_code=202)
+def run_batch(request: schemas.BatchRunRequest, db = Depends(get_db), user = Depends(can_admin_creator_access)):
+    """Populate (and optionally publish) several scripts, or all of them, in parallel. Poll the returned job_id."""
+    script_ids = request.script_ids
+    if script_ids is None:
+        script_ids = [script["id"] for script in crud.get_sql_scripts(db)]
+    try:
+        job = batch_executor.submit(
+            script_ids, publish=request.publish, publish_mode=request.publish_mode,
+            full_refresh=request.full_refresh, on_error=request.on_error, username=user.username
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    return job.to_dict(include_scripts=False)
+
+@api_router.get("/batch")
+def list_batches(user = Depends(can_admin_creator_access)):
+    """Recent batch jobs, newest first."""
+    return batch_executor.list()
+
+@api_router.get("/batch/{job_id}")
+def get_batch(job_id: str, user = Depends(can_admin_creator_access)):
+    """Aggregate progress and per-script results of a batch job."""
+    job = batch_executor.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job.to_dict()
+
+@api_router.post("/batch/{job_id}/cancel")
+def cancel_batch(job_id: str, user = Depends(can_admin_creator_access)):
+    """Skip the job's scripts that have not started; running ones finish."""
+    job = batch_executor.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job.to_dict(include_scripts=False)
+
 @api_router.get("/{script_id}", response_model=schemas.SQLScript)
 def get_script(script_id: int, db = Depends(get_db)):
     script = crud.get_sql_script(db, script_id)
@@ -181,7 +288,9 @@ def get_script(script_id: int, db = Depends(get_db)):
 
 @api_router.post("/", response_model=schemas.SQLScript)
 def create_script(script: schemas.SQLScriptCreate, db = Depends(get_db)):
-    return crud.create_sql_script(db, script.model_dump())
+    new_script = crud.create_sql_script(db, script.model_dump())
+    db_manager.invalidate_target_catalog('stg')  # new staging table
+    return new_script
 
 @api_router.put("/{script_id}", response_model=schemas.SQLScript)
 def update_script(script_id: int, script: schemas.SQLScriptCreate, db = Depends(get_db)):
@@ -190,23 +299,71 @@ def update_script(script_id: int, script: schemas.SQLScriptCreate, db = Depends(
 @api_router.delete("/{script_id}")
 def delete_script(script_id: int, db = Depends(get_db), user = Depends(can_admin_creator_access)):
     result = crud.delete_sql_script(db, script_id)
+    db_manager.invalidate_target_catalog('stg')  # staging table dropped
     if not result["success"]:
         raise HTTPException(status_code=404, detail="SQL script not found")
     return {"message": "Script deleted successfully"}
 
 @api_router.post("/execute")
-def execute_script(request: schemas.SQLExecuteRequest, db = Depends(get_db)):
+def execute_script(request: schemas.SQLExecuteRequest, db = Depends(get_db), user = Depends(get_current_user_from_cookie)):
     try:
-        return crud.execute_query(request.script_content, db)
+        return query_guard.run_guarded_query(
+            request.script_content, db, user, columnar=request.columnar, confirmed=request.confirmed
+        )
+    except query_guard.QueryCostExceededError as e:
+        return JSONResponse(status_code=409, content={
+            "detail": str(e),
+            "plan": e.plan,
+            "requires_confirmation": e.requires_confirmation
+        })
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@api_router.post("/profile")
+def profile_script(request: schemas.SQLExecuteRequest, db = Depends(get_db), user = Depends(get_current_user_from_cookie)):
+    """Run EXPLAIN (ANALYZE, BUFFERS) in a rolled-back read-only transaction and return the node timings."""
+    try:
+        return query_guard.profile_query(request.script_content, db, user, confirmed=request.confirmed)
+    except query_guard.QueryCostExceededError as e:
+        return JSONResponse(status_code=409, content={
+            "detail": str(e),
+            "plan": e.plan,
+            "requires_confirmation": e.requires_confirmation
+        })
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.post("/execute/stream")
+def execute_script_stream(request: schemas.SQLStreamRequest, db = Depends(get_db), user = Depends(get_current_user_from_cookie)):
+    """
+    Execute a query and stream the rows as NDJSON or CSV from a server-side cursor.
+    Results over the row/byte cap end with a truncation marker.
+    """
+    try:
+        _, chunks = query_guard.stream_guarded_query(
+            request.script_content, db, user, confirmed=request.confirmed, fmt=request.format,
+            max_rows=request.max_rows, max_bytes=request.max_bytes
+        )
+    except query_guard.QueryCostExceededError as e:
+        return JSONResponse(status_code=409, content={
+            "detail": str(e),
+            "plan": e.plan,
+            "requires_confirmation": e.requires_confirmation
+        })
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {"X-Accel-Buffering": "no"}  # don't let a reverse proxy buffer the stream
+    if request.format == "csv":
+        headers["Content-Disposition"] = 'attachment; filename="query_results.csv"'
+    return StreamingResponse(chunks, media_type=crud.STREAM_FORMATS[request.format], headers=headers)
+
 # Add populate and publish endpoints
 @api_router.post("/{script_id}/populate_table")
-def populate_table(script_id: int, db = Depends(get_db), user = Depends(can_admin_creator_access)):
-    """Populate the staging table for a specific SQL script"""
+def populate_table(script_id: int, full_refresh: bool = False, db = Depends(get_db), user = Depends(can_admin_creator_access)):
+    """Populate the staging table for a specific SQL script (incremental scripts append new rows unless full_refresh)"""
     try:
-        result = crud.populate_script_result_table(db, script_id)
+        result = crud.populate_script_result_table(db, script_id, full_refresh=full_refresh)
         return result
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=f"Failed to populate table for script {script_id}: {str(ve)}")
@@ -214,13 +371,44 @@ def populate_table(script_id: int, db = Depends(get_db), user = Depends(can_admi
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 @api_router.post("/{script_id}/publish")
-def publish_results(script_id: int, db = Depends(get_db), user = Depends(can_admin_creator_access)):
-    """Publish results from the script's staging table to the main bad_detail table."""
+def publish_results(script_id: int, mode: str = "auto", batch_size: Optional[int] = None, atomic: bool = False,
+                    db = Depends(get_db), user = Depends(can_admin_creator_access)):
+    """Publish results from the script's staging table to the main bad_detail table (mode: auto, full, incremental, delta or chunked)."""
     try:
-        result = crud.publish_script_results(db, script_id)
+        result = crud.publish_script_results(db, script_id, mode=mode, batch_size=batch_size, atomic=atomic)
         return result
     except Exception as e:
         if isinstance(e, ValueError):
             raise HTTPException(status_code=400, detail=f"Failed to publish results for script {script_id}: {str(e)}")
         else:
-            raise HTTPException(status_code=500, detail=f"An unexpected server error occurred while publishing results for script {script_id}: {str(e)}")
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=f"An unexpected server error occurred while publishing results for script {script_id}: {str(e)}")
+
+@api_router.get("/{script_id}/settings")
+def get_script_settings(script_id: int, db = Depends(get_db), user = Depends(can_admin_creator_access)):
+    """Incremental populate settings and watermarks of a script."""
+    return crud.get_script_settings(db, script_id)
+
+@api_router.put("/{script_id}/settings")
+def update_script_settings(script_id: int, settings: schemas.ScriptSettingsUpdate, db = Depends(get_db), user = Depends(can_admin_creator_access)):
+    """Enable/disable incremental populate or change the watermark column (which resets the watermarks)."""
+    if not crud.get_sql_script(db, script_id):
+        raise HTTPException(status_code=404, detail="Script not found")
+    try:
+        return crud.update_script_settings(db, script_id, settings.model_dump(exclude_unset=True))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+@api_router.post("/{script_id}/slices/verify")
+def verify_script_slices(script_id: int, slices: Optional[int] = None, db = Depends(get_db), user = Depends(can_admin_creator_access)):
+    """Check that the script run as hash slices returns the same rows as the unsliced script (nothing is written)."""
+    try:
+        return crud.verify_sliced_populate(db, script_id, slices=slices)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to verify slices for script {script_id}: {str(e)}")
+
+@api_router.post("/{script_id}/watermark/reset")
+def reset_script_watermark(script_id: int, db = Depends(get_db), user = Depends(can_admin_creator_access)):
+    """Forget the watermarks so the next populate and publish run in full."""
+    return crud.reset_script_watermark(db, script_id)
@@ -1,8 +1,16 @@
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
-from app.database import get_db
-from app import crud
+from app.database import get_db, get_pool_stats
+from app.multi_db_manager import db_manager
+from app import crud, async_crud
+from app.async_database import get_async_db, get_async_pool_stats
 from app.dependencies import templates, render_template
+from app.user_cache import user_cache
+from app.result_cache import result_cache
+from app.single_flight import query_flight, async_query_flight
+from app.request_db import request_db_stats
+from app.audit_log_writer import audit_log_writer
+from app.batch_executor import batch_executor
 from datetime import datetime, timedelta
 
 # API router
@@ -17,8 +25,28 @@ def get_stats(db = Depends(get_db)):
     bad_detail_count = crud.get_bad_detail_count(db)
     return {"script_count": script_count, "bad_detail_count": bad_detail_count}
 
+@router.get("/db_pool")
+def get_db_pool_stats():
+    """Connection pool usage (in-use, idle, waiters) for sizing the pools."""
+    return {
+        "default": get_pool_stats(),
+        "default_async": get_async_pool_stats(),
+        "connections": db_manager.get_pool_stats(),
+        "catalog_cache": db_manager.catalog_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "single_flight": {"sync": query_flight.stats(), "async": async_query_flight.stats()},
+        "batch_executor": batch_executor.stats(),
+        "requests": request_db_stats()
+    }
+
+@router.get("/audit_log")
+def get_audit_log_stats():
+    """Audit log writer queue depth, batches written and dropped/spilled events."""
+    return audit_log_writer.stats()
+
 @page_router.get("/visualization", response_class=HTMLResponse)
-async def visualization_page(request: Request, rule_id: str = None, source_id: str = None, show_all: bool = False, db = Depends(get_db)):
+async def visualization_page(request: Request, rule_id: str = None, source_id: str = None, show_all: bool = False, db = Depends(get_async_db)):
     """
     Display the data visualization page with charts showing bad details over time.
     
@@ -36,7 +64,7 @@ async def visualization_page(request: Request, rule_id: str = None, source_id: s
     rule_ids = []
     try:
         rule_id_query = "SELECT rule_id, rule_name FROM dq.rule_ref ORDER BY rule_id"
-        rule_id_results = crud.execute_query(rule_id_query, db)
+        rule_id_results = await async_crud.execute_cached_query(rule_id_query, db)
         if rule_id_results and rule_id_results.get('data'):
             # Create tuples with (id, label) format
             rule_ids = [(row.get('rule_id'), f"{row.get('rule_id')} - {row.get('rule_name')}") 
@@ -48,7 +76,7 @@ async def visualization_page(request: Request, rule_id: str = None, source_id: s
     source_ids = []
     try:
         source_id_query = "SELECT source_id, source_name FROM dq.source_ref ORDER BY source_id"
-        source_id_results = crud.execute_query(source_id_query, db)
+        source_id_results = await async_crud.execute_cached_query(source_id_query, db)
         if source_id_results and source_id_results.get('data'):
             # Create tuples with (id, label) format
             source_ids = [(row.get('source_id'), f"{row.get('source_id')} - {row.get('source_name')}") 
@@ -95,7 +123,7 @@ async def visualization_page(request: Request, rule_id: str = None, source_id: s
     
     # Execute query
     try:
-        results = crud.execute_query(query_str, db, params)
+        results = await async_crud.execute_cached_query(query_str, db, params)
         if results and results.get('data'):
             # Process data for charts
             
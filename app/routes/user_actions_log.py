@@ -15,7 +15,7 @@ router = APIRouter()
 
 
 @router.get("/user-actions-log", response_class=HTMLResponse)
-async def user_actions_log_page(
+def user_actions_log_page(
     request: Request,
     current_user=Depends(can_admin_creator_access),
     db=Depends(get_db),
@@ -98,7 +98,7 @@ async def user_actions_log_page(
 
 
 @router.get("/api/user-actions-log")
-async def get_user_actions_log_api(
+def get_user_actions_log_api(
     current_user=Depends(can_admin_creator_access),
     db=Depends(get_db),
     page: int = Query(1, ge=1),
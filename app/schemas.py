@@ -33,6 +33,29 @@ class SQLScript(SQLScriptBase):
 
 class SQLExecuteRequest(BaseModel):
     script_content: str
+    columnar: bool = False  # return {"columns": [...], "rows": [[...]]} instead of row dicts
+    confirmed: bool = False  # run even if the plan exceeds the role's cost thresholds
+
+class SQLStreamRequest(BaseModel):
+    script_content: str
+    format: str = "ndjson"  # "ndjson" or "csv"
+    max_rows: Optional[int] = None
+    max_bytes: Optional[int] = None
+    confirmed: bool = False
+
+class ScriptSettingsUpdate(BaseModel):
+    incremental: Optional[bool] = None
+    watermark_column: Optional[str] = None  # one of the script's columns, default txn_date
+    unlogged: Optional[bool] = None  # staging table UNLOGGED; null restores the STAGING_UNLOGGED default
+    slices: Optional[int] = None  # full populate runs as this many parallel hash slices (1 = off)
+    slice_column: Optional[str] = None  # one of the script's columns, default source_uid
+
+class BatchRunRequest(BaseModel):
+    script_ids: Optional[List[int]] = None  # None runs every script
+    publish: bool = False
+    publish_mode: str = "auto"
+    full_refresh: bool = False
+    on_error: str = "continue"  # "continue" or "fail_fast"
 
 # --- Schedule Schemas ---
 
@@ -0,0 +1,136 @@
+"""
+Column-typed serialization of query results for the DQX application.
+
+crud._format_value_for_json inspects every cell with an isinstance chain.
+ResultSerializer instead reads the type OIDs in cursor.description once and
+builds one converter per column, so each cell costs a single call (or none
+for text columns). Output matches _format_value_for_json, except that bytea
+values returned as memoryview by psycopg2 are decoded like bytes.
+
+Besides the existing list-of-dicts shape, results can be emitted as a
+columnar payload: {"columns": [...], "rows": [[...], ...]}, which avoids
+repeating the column names in every row.
+"""
+
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# PostgreSQL type OIDs (pg_type.oid)
+BOOL_OID = 16
+BYTEA_OID = 17
+NAME_OID = 19
+INT8_OID = 20
+INT2_OID = 21
+INT4_OID = 23
+TEXT_OID = 25
+OID_OID = 26
+FLOAT4_OID = 700
+FLOAT8_OID = 701
+BPCHAR_OID = 1042
+VARCHAR_OID = 1043
+DATE_OID = 1082
+TIME_OID = 1083
+TIMESTAMP_OID = 1114
+TIMESTAMPTZ_OID = 1184
+NUMERIC_OID = 1700
+
+
+def _format_bytes(value) -> str:
+    # str() decodes bytes, bytearray and memoryview alike without copying to bytes first
+    try:
+        return str(value, 'utf-8')
+    except UnicodeDecodeError:
+        return value.hex()
+
+
+# Date columns (txn_date, run dates) have few distinct values, so memoize them
+_format_date = lru_cache(maxsize=4096)(date.isoformat)
+
+
+def _format_generic(value: Any) -> Any:
+    """Fallback for types without a dedicated converter (same rules as crud._format_value_for_json)."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return _format_bytes(value)
+    return str(value)
+
+
+# Converter per type OID; None means the driver value is already JSON-ready
+_CONVERTERS: Dict[int, Optional[Callable[[Any], Any]]] = {
+    TEXT_OID: None,
+    VARCHAR_OID: None,
+    BPCHAR_OID: None,
+    NAME_OID: None,
+    INT2_OID: str,
+    INT4_OID: str,
+    INT8_OID: str,
+    OID_OID: str,
+    FLOAT4_OID: str,
+    FLOAT8_OID: str,
+    BOOL_OID: str,
+    NUMERIC_OID: float,
+    DATE_OID: _format_date,
+    TIME_OID: time.isoformat,
+    TIMESTAMP_OID: datetime.isoformat,
+    TIMESTAMPTZ_OID: datetime.isoformat,
+    BYTEA_OID: _format_bytes,
+}
+
+
+def _type_code(column) -> Optional[int]:
+    # psycopg2 Column and psycopg 3 Column both expose type_code
+    return getattr(column, "type_code", None)
+
+
+class ResultSerializer:
+    """Converts result rows using converters chosen once from cursor.description."""
+
+    def __init__(self, description: Optional[Sequence]):
+        description = description or []
+        self.column_names: List[str] = [column[0] for column in description]
+        self.converters: List[Optional[Callable[[Any], Any]]] = [
+            _CONVERTERS.get(_type_code(column), _format_generic) for column in description
+        ]
+        # Fast path: nothing to convert
+        self._passthrough = all(converter is None for converter in self.converters)
+
+    def _converted(self, rows: Sequence[Sequence]):
+        """Convert a batch column by column and return an iterator of converted row tuples."""
+        if not rows:
+            return iter(())
+        if self._passthrough:
+            return iter(rows)
+        columns = []
+        for converter, values in zip(self.converters, zip(*rows)):
+            if converter is None:
+                columns.append(values)
+            elif None in values:
+                columns.append([None if value is None else converter(value) for value in values])
+            else:
+                columns.append(map(converter, values))
+        return zip(*columns)
+
+    def convert_row(self, row: Sequence) -> list:
+        """Return the JSON-ready values of one row."""
+        if self._passthrough:
+            return list(row)
+        return [value if converter is None or value is None else converter(value)
+                for converter, value in zip(self.converters, row)]
+
+    def rows(self, rows: Sequence[Sequence]) -> List[list]:
+        """Convert many rows to lists of JSON-ready values."""
+        return [list(row) for row in self._converted(rows)]
+
+    def records(self, rows: Sequence[Sequence]) -> List[Dict[str, Any]]:
+        """Convert rows to dicts keyed by column name (the execute_query 'data' shape)."""
+        names = self.column_names
+        return [dict(zip(names, row)) for row in self._converted(rows)]
+
+    def columnar(self, rows: Sequence[Sequence]) -> Dict[str, Any]:
+        """Convert rows to {"columns": [...], "rows": [[...], ...]}."""
+        return {"columns": list(self.column_names), "rows": self.rows(rows)}
@@ -0,0 +1,129 @@
+"""
+Single-flight deduplication of concurrent identical reads for the DQX application.
+
+When a publish finishes, many dashboards refresh at once and issue the same
+queries. SingleFlight (threads) and AsyncSingleFlight (asyncio) make concurrent
+callers with the same key wait for one in-flight execution and share its
+result or exception instead of each running the query. Nothing is kept once
+the call finishes; caching across time is result_cache's job.
+
+Only use it for read-only calls whose result may be shared between callers.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Counters:
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def as_dict(self, in_flight: int) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "in_flight": in_flight,
+        }
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-safe single-flight: one execution per key at a time, shared by all waiting callers."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._counters = _Counters()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._counters.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counters.executions += 1
+            else:
+                self._counters.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._counters.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._counters.as_dict(len(self._calls))
+
+
+class AsyncSingleFlight:
+    """asyncio single-flight; one instance per event loop."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._counters = _Counters()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        self._counters.calls += 1
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            self._counters.coalesced += 1
+            # wait() does not propagate the leader's cancellation to us
+            await asyncio.wait({future})
+            if not future.cancelled():
+                return future.result()
+            # The leader was cancelled: retry, possibly becoming the leader
+            self._counters.coalesced -= 1
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        self._counters.executions += 1
+        try:
+            result = await func()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            self._counters.errors += 1
+            future.set_exception(e)
+            future.exception()  # mark retrieved; followers (if any) re-raise it
+            raise
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return self._counters.as_dict(len(self._calls))
+
+
+# Global instances used by crud.execute_cached_query and async_crud.execute_cached_query
+query_flight = SingleFlight()
+async_query_flight = AsyncSingleFlight()
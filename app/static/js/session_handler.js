@@ -3,14 +3,35 @@
  * Handles session timeout and authentication checks
  */
 
+// Bounds for scheduling the next check (milliseconds)
+const SESSION_CHECK_MIN_DELAY = 5000;        // never poll faster than every 5 seconds
+const SESSION_CHECK_MAX_DELAY = 15 * 60000;  // re-check at least every 15 minutes (logout in another tab)
+let sessionCheckTimer = null;
+
 document.addEventListener('DOMContentLoaded', function() {
     // Check if session is valid
     checkSessionStatus();
     
-    // Set up periodic checks every minute
-    setInterval(checkSessionStatus, 60000); // Check every minute
+    // Re-check when the tab becomes visible again (timers are throttled in background tabs)
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'visible') {
+            checkSessionStatus();
+        }
+    });
 });
 
+/**
+ * Schedule the next session check shortly after the token expires
+ */
+function scheduleSessionCheck(expiresIn) {
+    clearTimeout(sessionCheckTimer);
+    let delay = SESSION_CHECK_MAX_DELAY;
+    if (typeof expiresIn === 'number') {
+        delay = Math.min(Math.max(expiresIn * 1000 + 1000, SESSION_CHECK_MIN_DELAY), SESSION_CHECK_MAX_DELAY);
+    }
+    sessionCheckTimer = setTimeout(checkSessionStatus, delay);
+}
+
 /**
  * Check if the current session is valid
  * If not, show the login modal
@@ -34,10 +55,13 @@ function checkSessionStatus() {
     .then(data => {
         if (data && !data.valid) {
             showLoginModal();
+        } else if (data) {
+            scheduleSessionCheck(data.expires_in);
         }
     })
     .catch(error => {
         console.error('Error checking session status:', error);
+        scheduleSessionCheck(null);
     });
 }
 
@@ -0,0 +1,81 @@
+"""
+In-memory revocation list for JWT access tokens.
+
+Session checks validate the token signature and expiry only, without a
+database lookup. To still end sessions early this module keeps two small,
+self-pruning lists:
+
+- revoked tokens (by SHA-256 hash), added on logout and kept until the token
+  would have expired anyway;
+- revoked subjects (usernames), added when a user is deactivated, deleted or
+  renamed. Every token for that user issued at or before the revocation time
+  is rejected, so logging in again afterwards works as usual.
+
+The lists live in the process that handled the logout or user change.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Tokens never outlive this, so revoked subjects can be forgotten after it
+ACCESS_TOKEN_LIFETIME_SECONDS = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60")) * 60
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenRevocationList:
+    """Thread-safe set of revoked tokens and subjects with automatic expiry."""
+
+    def __init__(self, token_lifetime: int = ACCESS_TOKEN_LIFETIME_SECONDS):
+        self.token_lifetime = token_lifetime
+        self._tokens: Dict[str, float] = {}    # token hash -> token expiry (epoch seconds)
+        self._subjects: Dict[str, float] = {}  # username -> revoked at (epoch seconds)
+        self._lock = threading.Lock()
+
+    def revoke_token(self, token: str, expires_at: Optional[float] = None):
+        """Revoke a single token until it expires."""
+        expires_at = expires_at if expires_at is not None else time.time() + self.token_lifetime
+        with self._lock:
+            self._prune(time.time())
+            self._tokens[_token_hash(token)] = expires_at
+
+    def revoke_subject(self, username: str):
+        """Revoke every token issued to a user up to now."""
+        with self._lock:
+            self._prune(time.time())
+            self._subjects[username] = time.time()
+
+    def is_revoked(self, token: str, payload: Dict[str, Any]) -> bool:
+        """Check a decoded token against both lists."""
+        with self._lock:
+            if not self._tokens and not self._subjects:
+                return False
+            if _token_hash(token) in self._tokens:
+                return True
+            revoked_at = self._subjects.get(payload.get("sub"))
+            if revoked_at is None:
+                return False
+            issued_at = payload.get("iat")
+            # Tokens without iat predate revocation support
+            return issued_at is None or issued_at <= revoked_at
+
+    def _prune(self, now: float):
+        for token_hash in [h for h, expires_at in self._tokens.items() if expires_at <= now]:
+            del self._tokens[token_hash]
+        cutoff = now - self.token_lifetime
+        for username in [u for u, revoked_at in self._subjects.items() if revoked_at <= cutoff]:
+            del self._subjects[username]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._prune(time.time())
+            return {"revoked_tokens": len(self._tokens), "revoked_subjects": len(self._subjects)}
+
+
+# Global instance used by auth, the auth routes and user_crud
+token_revocations = TokenRevocationList()
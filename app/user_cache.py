@@ -0,0 +1,117 @@
+"""
+In-process cache of authenticated users for the DQX application.
+
+UserMiddleware and get_current_user_from_cookie both resolve the JWT subject
+to a User on every request. This cache lets them share one lookup: entries are
+keyed by username, expire after USER_CACHE_TTL seconds and the cache holds at
+most USER_CACHE_MAX_SIZE users (least recently used are evicted first).
+
+user_crud invalidates entries explicitly when a user is updated, deactivated
+or deleted, so role and deactivation changes take effect immediately in this
+process. Other worker processes pick them up once their entry expires.
+
+A lookup that started before an invalidation must not cache what it read:
+callers take generation() before querying the database and pass it to set(),
+which ignores the user if its username or id was invalidated in the meantime.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.models import User
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "1000"))
+
+
+class UserCache:
+    """Thread-safe TTL + LRU cache of User objects keyed by username."""
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_size: int = USER_CACHE_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        # Generation of the last invalidation per ("username", name) / ("id", user_id),
+        # oldest first; only the most recent max_size are kept
+        self._invalidated: "OrderedDict[tuple, int]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._stale_sets = 0
+
+    def get(self, username: str) -> Optional[User]:
+        """Return the cached user, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                self._misses += 1
+                return None
+            cached_at, user = entry
+            if time.monotonic() - cached_at >= self.ttl:
+                del self._entries[username]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self._hits += 1
+            return user
+
+    def generation(self) -> int:
+        """Return the current generation; take it before loading a user to cache."""
+        with self._lock:
+            return self._generation
+
+    def set(self, user: User, generation: int):
+        """Cache a user under its username, unless it was invalidated after generation was taken."""
+        if self.ttl <= 0 or self.max_size <= 0 or user is None:
+            return
+        with self._lock:
+            if (self._invalidated.get(("username", user.username), -1) > generation
+                    or self._invalidated.get(("id", user.id), -1) > generation):
+                self._stale_sets += 1
+                return
+            self._entries[user.username] = (time.monotonic(), user)
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: Optional[str] = None, user_id: Optional[int] = None):
+        """Drop the entry for a username and/or every entry for a user id."""
+        with self._lock:
+            self._generation += 1
+            for key in (("username", username), ("id", user_id)):
+                if key[1] is not None:
+                    self._invalidated[key] = self._generation
+                    self._invalidated.move_to_end(key)
+            while len(self._invalidated) > max(self.max_size, 1):
+                self._invalidated.popitem(last=False)
+            if username is not None and self._entries.pop(username, None) is not None:
+                self._invalidations += 1
+            if user_id is not None:
+                for key in [key for key, (_, user) in self._entries.items() if user.id == user_id]:
+                    del self._entries[key]
+                    self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ttl": self.ttl,
+                "max_size": self.max_size,
+                "size": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+                "stale_sets": self._stale_sets,
+            }
+
+
+# Global instance shared by UserMiddleware and the auth dependencies
+user_cache = UserCache()
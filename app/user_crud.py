@@ -7,6 +7,8 @@ from datetime import datetime
 from typing import Optional, List, Dict, Any
 from app.models import User
 from app.auth import get_password_hash
+from app.user_cache import user_cache
+from app.token_revocation import token_revocations
 
 
 # ========================================================================================
@@ -132,7 +134,8 @@ def get_users(db) -> List[User]:
 
 def update_user(db, user_id: int, update_data: Dict[str, Any]) -> Optional[User]:
     """Update a user's information."""
-    if not get_user_by_id(db, user_id):
+    existing_user = get_user_by_id(db, user_id)
+    if not existing_user:
         return None
         
     cursor = None
@@ -165,6 +168,14 @@ def update_user(db, user_id: int, update_data: Dict[str, Any]) -> Optional[User]
         result = cursor.fetchone()
         db.commit()
         
+        # Drop cached copies under both the old and the new username
+        user_cache.invalidate(username=update_data.get("username"), user_id=user_id)
+        
+        # End existing sessions of deactivated or renamed users
+        new_username = update_data.get("username")
+        if update_data.get("is_active") is False or (new_username and new_username != existing_user.username):
+            token_revocations.revoke_subject(existing_user.username)
+        
         return _create_user_from_row(result) if result else None
         
     except psycopg2.Error as e:
@@ -182,11 +193,15 @@ def deactivate_user(db, user_id: int) -> bool:
         cursor = db.cursor()
         cursor.execute("""
             UPDATE dq.users SET is_active = false, updated_at = %s WHERE id = %s
+            RETURNING username
         """, (datetime.now(), user_id))
         
-        success = cursor.rowcount > 0
+        row = cursor.fetchone()
+        success = row is not None
         if success:
             db.commit()
+            user_cache.invalidate(user_id=user_id)
+            token_revocations.revoke_subject(row[0])
         return success
         
     except psycopg2.Error as e:
@@ -202,11 +217,14 @@ def delete_user(db, user_id: int) -> bool:
     cursor = None
     try:
         cursor = db.cursor()
-        cursor.execute("DELETE FROM dq.users WHERE id = %s", (user_id,))
+        cursor.execute("DELETE FROM dq.users WHERE id = %s RETURNING username", (user_id,))
         
-        success = cursor.rowcount > 0
+        row = cursor.fetchone()
+        success = row is not None
         if success:
             db.commit()
+            user_cache.invalidate(user_id=user_id)
+            token_revocations.revoke_subject(row[0])
         return success
         
     except psycopg2.Error as e:
@@ -0,0 +1,87 @@
+-- Convert dq.bad_detail from a plain heap table to a table LIST-partitioned by rule_id.
+--
+-- Each rule_id gets its own partition dq.bad_detail_r_<first 16 hex chars of md5(rule_id::text)>
+-- (the same naming crud._partition_name uses), plus a default partition for rule_ids
+-- that have never been published. Publishing a script then swaps its rules' partitions
+-- (DETACH/ATTACH) instead of deleting and re-inserting rows.
+--
+-- Works with either documented layout of dq.bad_detail (with a serial id primary key, or
+-- keyed by (rule_id, source_id, source_uid)): the primary and unique keys of the existing
+-- table are recreated on the new one, with rule_id added where it is missing because keys
+-- of a partitioned table must include the partition key.
+--
+-- Everything runs in one transaction; any error rolls the whole migration back (run with
+-- psql -v ON_ERROR_STOP=1 -f ...). Run in a maintenance window: the copy below holds locks
+-- on the old table until COMMIT. The old table is kept as dq.bad_detail_heap; drop it once
+-- the new layout is verified.
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+ALTER TABLE dq.bad_detail RENAME TO bad_detail_heap;
+
+-- Same columns, types and defaults (a serial id keeps drawing from the existing sequence)
+CREATE TABLE dq.bad_detail (LIKE dq.bad_detail_heap INCLUDING DEFAULTS)
+    PARTITION BY LIST (rule_id);
+
+DO $$
+DECLARE
+    con RECORD;
+    cols TEXT[];
+    seq TEXT;
+BEGIN
+    -- Recreate the heap table's primary and unique keys, extended with rule_id
+    FOR con IN
+        SELECT c.conname, c.contype,
+               array_agg(a.attname::text ORDER BY k.ord) AS columns
+        FROM pg_constraint c
+        CROSS JOIN LATERAL unnest(c.conkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+        WHERE c.conrelid = 'dq.bad_detail_heap'::regclass AND c.contype IN ('p', 'u')
+        GROUP BY c.conname, c.contype
+        ORDER BY c.contype
+    LOOP
+        cols := con.columns;
+        IF NOT 'rule_id' = ANY(cols) THEN
+            cols := cols || 'rule_id'::text;
+        END IF;
+        EXECUTE format(
+            'ALTER TABLE dq.bad_detail ADD CONSTRAINT %I %s (%s)',
+            left(con.conname, 58) || '_part',
+            CASE con.contype WHEN 'p' THEN 'PRIMARY KEY' ELSE 'UNIQUE' END,
+            (SELECT string_agg(quote_ident(col), ', ') FROM unnest(cols) AS col)
+        );
+    END LOOP;
+
+    FOR con IN SELECT DISTINCT rule_id FROM dq.bad_detail_heap WHERE rule_id IS NOT NULL LOOP
+        EXECUTE format(
+            'CREATE TABLE dq.%I PARTITION OF dq.bad_detail FOR VALUES IN (%L)',
+            'bad_detail_r_' || left(md5(con.rule_id::text), 16), con.rule_id
+        );
+    END LOOP;
+
+    -- Hand a serial id's sequence over to the new table so dropping the heap table keeps it
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'dq' AND table_name = 'bad_detail_heap' AND column_name = 'id'
+    ) THEN
+        seq := pg_get_serial_sequence('dq.bad_detail_heap', 'id');
+        IF seq IS NOT NULL THEN
+            EXECUTE format('ALTER SEQUENCE %s OWNED BY dq.bad_detail.id', seq);
+        END IF;
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_bad_detail_part_rule_source ON dq.bad_detail (rule_id, source_id);
+
+CREATE TABLE dq.bad_detail_default PARTITION OF dq.bad_detail DEFAULT;
+
+INSERT INTO dq.bad_detail SELECT * FROM dq.bad_detail_heap;
+
+ANALYZE dq.bad_detail;
+
+COMMIT;
+
+-- After verifying row counts:
+-- DROP TABLE dq.bad_detail_heap;
@@ -0,0 +1,102 @@
+"""
+Concurrent-request throughput: blocking psycopg2 in async handlers vs the async path.
+
+Builds a small FastAPI app with two equivalent endpoints that run a slow query
+(SELECT pg_sleep) against the configured DQX database:
+
+    /blocking  - async handler calling crud.execute_query on a psycopg2 connection
+                 (the pattern used by the routes before the async data-access layer)
+    /async     - async handler calling async_crud.execute_query on a psycopg 3
+                 connection from app.async_database
+
+Requests are fired concurrently in-process through httpx's ASGI transport, so
+the numbers reflect the event loop and database, not network overhead.
+
+Usage:
+    python benchmarks/bench_async_routes.py --requests 200 --concurrency 50 --sleep 0.05
+
+Requires the DB_* settings from .env to point at a reachable PostgreSQL server.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import httpx
+from fastapi import Depends, FastAPI
+
+from app import async_crud, crud
+from app.async_database import close_async_db_pool, get_async_db
+from app.database import close_db_pool, get_db
+
+
+def build_app(sleep_seconds: float) -> FastAPI:
+    bench_app = FastAPI()
+    query = "SELECT pg_sleep(%s) AS slept"
+
+    @bench_app.get("/blocking")
+    async def blocking(db=Depends(get_db)):
+        return crud.execute_query(query, db, [sleep_seconds])
+
+    @bench_app.get("/async")
+    async def non_blocking(db=Depends(get_async_db)):
+        return await async_crud.execute_query(query, db, [sleep_seconds])
+
+    return bench_app
+
+
+async def run(client: httpx.AsyncClient, path: str, total: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "path": path,
+        "requests": total,
+        "seconds": elapsed,
+        "req_per_sec": total / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--sleep", type=float, default=0.05, help="seconds each query sleeps in the database")
+    args = parser.parse_args()
+
+    transport = httpx.ASGITransport(app=build_app(args.sleep))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up both pools so connection setup isn't measured
+        await client.get("/blocking")
+        await client.get("/async")
+
+        print(f"{'endpoint':<12}{'requests':>10}{'seconds':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for path in ("/blocking", "/async"):
+            result = await run(client, path, args.requests, args.concurrency)
+            print(f"{result['path']:<12}{result['requests']:>10}{result['seconds']:>10.2f}"
+                  f"{result['req_per_sec']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}")
+
+    close_db_pool()
+    await close_async_db_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
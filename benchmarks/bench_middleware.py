@@ -0,0 +1,126 @@
+"""
+Requests/sec through the DQX middleware stack: BaseHTTPMiddleware vs pure ASGI.
+
+Builds two FastAPI apps with a trivial authenticated endpoint (GET /api/ping,
+which depends on get_current_user_from_cookie):
+
+    basehttp  - UserMiddleware, UserActionLoggingMiddleware and the auth check
+                written as BaseHTTPMiddleware, as they were before
+    asgi      - the pure ASGI middleware from app.middleware_logging
+
+The test user is put in the user cache up front and /api/ping is not an
+audited action, so no database is needed: the numbers measure middleware
+overhead only. Requests are sent in-process through httpx's ASGI transport.
+
+Usage:
+    python benchmarks/bench_middleware.py --requests 5000 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import httpx
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+# app.middleware_logging first: it imports app.crud before app.auth, like app.main
+from app.middleware_logging import AuthCheckMiddleware, UserActionLoggingMiddleware, UserMiddleware
+from app.auth import create_access_token
+from app.dependencies_auth import get_current_user_from_cookie
+from app.models import User
+from app.user_cache import user_cache
+
+
+# Helper methods are shared, only the middleware plumbing differs
+_user_middleware = UserMiddleware(None)
+_logging_middleware = UserActionLoggingMiddleware(None)
+
+
+class LegacyUserMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        request.state.user = None
+        try:
+            _user_middleware._process_user_token(request)
+        except Exception:
+            request.state.user = None
+        return await call_next(request)
+
+
+class LegacyUserActionLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        if 200 <= response.status_code < 300:
+            _logging_middleware._log_action_if_needed(request, response.status_code)
+        return response
+
+
+async def legacy_auth_check(request: Request, call_next):
+    path = request.url.path
+    if path == "/" or path.startswith(AuthCheckMiddleware.PUBLIC_PREFIXES):
+        return await call_next(request)
+    user = getattr(request.state, "user", None)
+    if user is None and path.startswith("/api/"):
+        return JSONResponse(status_code=401, content={"detail": "Authentication required"})
+    return await call_next(request)
+
+
+def build_app(kind: str) -> FastAPI:
+    bench_app = FastAPI()
+
+    @bench_app.get("/api/ping")
+    def ping(user=Depends(get_current_user_from_cookie)):
+        return {"user": user.username}
+
+    if kind == "basehttp":
+        bench_app.add_middleware(BaseHTTPMiddleware, dispatch=legacy_auth_check)
+        bench_app.add_middleware(LegacyUserMiddleware)
+        bench_app.add_middleware(LegacyUserActionLoggingMiddleware)
+    else:
+        bench_app.add_middleware(AuthCheckMiddleware)
+        bench_app.add_middleware(UserMiddleware)
+        bench_app.add_middleware(UserActionLoggingMiddleware)
+    return bench_app
+
+
+async def run(kind: str, total: int, concurrency: int, cookies: dict) -> dict:
+    transport = httpx.ASGITransport(app=build_app(kind))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", cookies=cookies) as client:
+        (await client.get("/api/ping")).raise_for_status()  # warm up
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                response = await client.get("/api/ping")
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {"kind": kind, "requests": total, "seconds": elapsed, "req_per_sec": total / elapsed}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    user_cache.set(User(id=1, username="bench", email="bench@example.com", hashed_password="-", role="admin"))
+    cookies = {"access_token": f"Bearer {create_access_token({'sub': 'bench'})}"}
+
+    print(f"{'stack':<10}{'requests':>10}{'seconds':>10}{'req/s':>10}")
+    for kind in ("basehttp", "asgi"):
+        result = await run(kind, args.requests, args.concurrency, cookies)
+        print(f"{result['kind']:<10}{result['requests']:>10}{result['seconds']:>10.2f}{result['req_per_sec']:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""
+Result serialization: per-cell isinstance chain vs column-typed converters.
+
+Serializes a synthetic result (default 1,000,000 rows x 10 columns: integers,
+numerics, dates, timestamps, text, bytea and booleans) three ways and times
+conversion plus json.dumps:
+
+    legacy     - crud._process_result_row per row (list of dicts)
+    records    - ResultSerializer.records (same list-of-dicts shape)
+    columnar   - ResultSerializer.columnar ({"columns": [...], "rows": [[...]]})
+
+No database is needed: rows are built in memory with the same Python types
+psycopg2 returns, and cursor.description is built from the matching type OIDs.
+
+Usage:
+    python benchmarks/bench_serialization.py --rows 1000000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from psycopg2.extensions import Column
+
+from app import crud
+from app import serialization as s
+
+COLUMNS = [
+    ("id", s.INT4_OID),
+    ("source_uid", s.INT8_OID),
+    ("amount", s.NUMERIC_OID),
+    ("ratio", s.NUMERIC_OID),
+    ("txn_date", s.DATE_OID),
+    ("created_at", s.TIMESTAMP_OID),
+    ("rule_id", s.TEXT_OID),
+    ("data_value", s.VARCHAR_OID),
+    ("payload", s.BYTEA_OID),
+    ("is_active", s.BOOL_OID),
+]
+
+# Distinct rows generated up front and repeated, so memory stays small
+DISTINCT_ROWS = 1000
+
+
+def build_rows(count: int) -> list:
+    base_date = date(2024, 1, 1)
+    base_ts = datetime(2024, 1, 1, 8, 30)
+    distinct = [
+        (
+            i,
+            10_000_000_000 + i,
+            Decimal(f"{i}.25"),
+            Decimal("0.125") * i,
+            base_date + timedelta(days=i % 365),
+            base_ts + timedelta(minutes=i),
+            f"RULE_{i % 50:03d}",
+            f"value {i}",
+            memoryview(f"payload-{i}".encode() if i % 2 else bytes([0xff, i % 256])),
+            i % 3 == 0,
+        )
+        for i in range(DISTINCT_ROWS)
+    ]
+    return [distinct[i % DISTINCT_ROWS] for i in range(count)]
+
+
+def timed(label: str, func, rows: int):
+    started = time.perf_counter()
+    payload = func()
+    converted = time.perf_counter()
+    encoded = json.dumps(payload)
+    finished = time.perf_counter()
+    print(f"{label:<10}{converted - started:>12.2f}{finished - converted:>12.2f}{finished - started:>12.2f}"
+          f"{rows / (finished - started):>14,.0f}{len(encoded) / 1e6:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    description = [Column(name=name, type_code=oid) for name, oid in COLUMNS]
+    column_names = [name for name, _ in COLUMNS]
+    rows = build_rows(args.rows)
+    serializer = s.ResultSerializer(description)
+
+    # The two list-of-dicts paths must agree (bytea aside: legacy prints memoryview objects)
+    sample = rows[:DISTINCT_ROWS]
+    legacy = [crud._process_result_row(row, column_names) for row in sample]
+    fast = serializer.records(sample)
+    for old, new in zip(legacy, fast):
+        old.pop("payload"), new.pop("payload")
+        assert old == new, (old, new)
+
+    print(f"{'path':<10}{'convert s':>12}{'json s':>12}{'total s':>12}{'rows/s':>14}{'JSON MB':>12}")
+    timed("legacy", lambda: {"data": [crud._process_result_row(row, column_names) for row in rows],
+                             "column_names": column_names}, args.rows)
+    timed("records", lambda: {"data": serializer.records(rows), "column_names": column_names}, args.rows)
+    timed("columnar", lambda: serializer.columnar(rows), args.rows)
+
+
+if __name__ == "__main__":
+    main()
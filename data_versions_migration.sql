@@ -0,0 +1,65 @@
+-- Shared data versions for the in-process result cache (app/result_cache.py)
+--
+-- Each cached table has a sequence dq.<table>_data_version. Statement triggers call
+-- nextval() on it for every statement that changes the table, whichever process runs it
+-- (any uvicorn worker, the scheduler, psql), and the application bumps it again after
+-- committing a publish or reference edit (crud.bump_data_version). Before serving a cached
+-- result, each worker compares the versions of the query's tables (the dq.data_versions
+-- view) with the ones it last saw.
+--
+-- nextval() takes no row lock and is not rolled back, so concurrent writers never wait on
+-- each other here (a rolled-back write only causes a spurious invalidation). The trigger
+-- bump happens before the writer commits: a reader running in between can cache rows from
+-- before the change under the new version. The application's post-commit bump closes that
+-- window for its own writes; for other writers it lasts until the next bump or
+-- RESULT_CACHE_TTL.
+--
+-- Re-run this script after bad_detail_partition_migration.sql: that migration replaces
+-- dq.bad_detail, and the trigger has to be created on the new (partitioned) table.
+
+BEGIN;
+
+-- Earlier versions of this script kept the counters in a table (one hot row per table)
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'dq' AND c.relname = 'data_versions' AND c.relkind = 'r'
+    ) THEN
+        DROP TABLE dq.data_versions;
+    END IF;
+END $$;
+
+CREATE SEQUENCE IF NOT EXISTS dq.bad_detail_data_version;
+CREATE SEQUENCE IF NOT EXISTS dq.rule_ref_data_version;
+CREATE SEQUENCE IF NOT EXISTS dq.source_ref_data_version;
+
+-- Current version per cached table (0 until the first bump)
+CREATE OR REPLACE VIEW dq.data_versions AS
+SELECT t.table_name,
+       COALESCE(pg_sequence_last_value(to_regclass(t.table_name || '_data_version')), 0) AS version
+FROM (VALUES ('dq.bad_detail'), ('dq.rule_ref'), ('dq.source_ref')) AS t(table_name);
+
+CREATE OR REPLACE FUNCTION dq.bump_data_version() RETURNS trigger AS $$
+BEGIN
+    PERFORM nextval(format('%I.%I', TG_TABLE_SCHEMA, TG_TABLE_NAME || '_data_version')::regclass);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bad_detail_data_version ON dq.bad_detail;
+CREATE TRIGGER bad_detail_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON dq.bad_detail
+    FOR EACH STATEMENT EXECUTE FUNCTION dq.bump_data_version();
+
+DROP TRIGGER IF EXISTS rule_ref_data_version ON dq.rule_ref;
+CREATE TRIGGER rule_ref_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON dq.rule_ref
+    FOR EACH STATEMENT EXECUTE FUNCTION dq.bump_data_version();
+
+DROP TRIGGER IF EXISTS source_ref_data_version ON dq.source_ref;
+CREATE TRIGGER source_ref_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON dq.source_ref
+    FOR EACH STATEMENT EXECUTE FUNCTION dq.bump_data_version();
+
+COMMIT;
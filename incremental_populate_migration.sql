@@ -0,0 +1,23 @@
+-- Per-script populate/publish settings for incremental (watermark-based) populate
+
+CREATE TABLE IF NOT EXISTS dq.dq_script_settings (
+    script_id INTEGER PRIMARY KEY REFERENCES dq.dq_sql_scripts(id) ON DELETE CASCADE,
+    incremental BOOLEAN NOT NULL DEFAULT FALSE,
+    watermark_column VARCHAR(63) NOT NULL DEFAULT 'txn_date',
+    -- Highest watermark_column value loaded into stg.dq_script_<id> (text, compared as the column's type)
+    watermark_value TEXT,
+    -- Highest value already published to dq.bad_detail; NULL means the next publish is a full one
+    published_watermark TEXT,
+    watermark_updated_at TIMESTAMP,
+    -- Staging table UNLOGGED (no WAL, emptied after a crash, not replicated); NULL follows STAGING_UNLOGGED
+    unlogged BOOLEAN,
+    -- Full populate runs the script as this many parallel hash slices of slice_column
+    slices INTEGER NOT NULL DEFAULT 1,
+    slice_column VARCHAR(63) NOT NULL DEFAULT 'source_uid',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- For databases that ran an earlier version of this migration
+ALTER TABLE dq.dq_script_settings ADD COLUMN IF NOT EXISTS unlogged BOOLEAN;
+ALTER TABLE dq.dq_script_settings ADD COLUMN IF NOT EXISTS slices INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE dq.dq_script_settings ADD COLUMN IF NOT EXISTS slice_column VARCHAR(63) NOT NULL DEFAULT 'source_uid';